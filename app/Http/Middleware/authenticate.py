@@ -1,16 +1,20 @@
 import hashlib
 import logging
+import time
 from datetime import datetime, timezone
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy import select
 from sqlalchemy.exc import ProgrammingError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.database import get_db
+from app.config import ADMIN_USER_IDS
+from app.db.database import get_async_db
 from app.models.user import User
 from app.models.personal_access_tokens import PersonalAccessToken
+from app.services.token_cache import LAST_USED_WRITER, TOKEN_CACHE, AuthResult
 from app.utils.logger import logger
+from app.utils.metrics import UPSTREAM_ERRORS, record_stage
 
 auth_scheme = HTTPBearer(bearerFormat="Token")
 
@@ -31,25 +35,18 @@ def hash_sanctum_token(plain_token: str) -> str:
     return hashlib.sha256(random_part.encode("utf-8")).hexdigest()
 
 
-async def authenticate(
-    credentials: HTTPAuthorizationCredentials = Depends(auth_scheme),
-    db: Session = Depends(get_db),
-):
+async def _lookup_token(db: AsyncSession, token_hash: str) -> AuthResult:
     """
-    Validates a Sanctum personal access token.
-    Returns User (ORM) if valid, raises HTTP errors otherwise.
+    Resolve a token hash and its owner with one query.
     """
-    if not credentials or not credentials.credentials:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
-
-    plain_token = credentials.credentials.strip()
-    token_hash = hash_sanctum_token(plain_token)
-
     try:
-        pat = db.execute(
-            select(PersonalAccessToken).where(PersonalAccessToken.token == token_hash)
-        ).scalars().first()
+        row = (await db.execute(
+            select(PersonalAccessToken, User)
+            .outerjoin(User, User.id == PersonalAccessToken.tokenable_id)
+            .where(PersonalAccessToken.token == token_hash)
+        )).first()
     except ProgrammingError as exc:
+        UPSTREAM_ERRORS.inc(upstream="mysql", stage="auth")
         logger.exception("DB error querying personal_access_tokens: %s", exc)
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -59,27 +56,59 @@ async def authenticate(
             ),
         )
 
-    if not pat:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
-    if getattr(pat, "expires_at", None):
-        expires_at = pat.expires_at
-        if expires_at and expires_at.replace(tzinfo=timezone.utc) < datetime.now(timezone.utc):
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
+    if not row:
+        return AuthResult(error_status=status.HTTP_401_UNAUTHORIZED, error_detail="Invalid token")
+    pat, user = row
 
     if pat.tokenable_type and "User" not in pat.tokenable_type:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token not valid for users")
+        return AuthResult(error_status=status.HTTP_403_FORBIDDEN, error_detail="Token not valid for users")
 
-    try:
-        if hasattr(pat, "last_used_at"):
-            pat.last_used_at = datetime.now(timezone.utc)
-            db.add(pat)
-            db.commit()
-    except Exception:
-        db.rollback()
-
-    user = db.execute(select(User).where(User.id == pat.tokenable_id)).scalars().first()
     if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token owner not found")
+        return AuthResult(error_status=status.HTTP_401_UNAUTHORIZED, error_detail="Token owner not found")
+
+    # The user outlives this session in the cache; it is only read from now on
+    db.expunge(user)
+    return AuthResult(user=user, token_id=pat.id, expires_at=getattr(pat, "expires_at", None))
 
+
+async def authenticate(
+    credentials: HTTPAuthorizationCredentials = Depends(auth_scheme),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Validates a Sanctum personal access token.
+    Returns User (ORM) if valid, raises HTTP errors otherwise.
+    Lookups are cached briefly (see TOKEN_CACHE) and last_used_at is written behind.
+    """
+    if not credentials or not credentials.credentials:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
+
+    plain_token = credentials.credentials.strip()
+    token_hash = hash_sanctum_token(plain_token)
+
+    started = time.perf_counter()
+    result = TOKEN_CACHE.get(token_hash)
+    if result is None:
+        result = await _lookup_token(db, token_hash)
+        TOKEN_CACHE.put(token_hash, result)
+    record_stage("auth", time.perf_counter() - started)
+
+    if not result.ok:
+        raise HTTPException(status_code=result.error_status, detail=result.error_detail)
+
+    # Checked on every request, the cached entry may outlive the token
+    expires_at = result.expires_at
+    if expires_at and expires_at.replace(tzinfo=timezone.utc) < datetime.now(timezone.utc):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
+
+    LAST_USED_WRITER.touch(result.token_id)
+    return result.user
+
+
+async def require_admin(user: User = Depends(authenticate)):
+    """
+    Like authenticate, but only for users listed in ADMIN_USER_IDS.
+    """
+    if user.id not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     return user
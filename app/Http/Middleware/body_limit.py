@@ -0,0 +1,53 @@
+from typing import Dict
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+
+
+class BodySizeLimitMiddleware:
+    """
+    Pure ASGI middleware capping request bodies per path.
+    Starlette reads (and spools) the whole multipart body before the route runs,
+    so a limit checked in the route only applies after the upload has arrived.
+    Here a too-large Content-Length is refused before anything is read, and a
+    chunked body is cut off as soon as it goes over the limit.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        """
+        :param limits: Maximum body size in bytes by exact request path.
+        """
+        self.app = app
+        self.limits = dict(limits)
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                response = JSONResponse(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    content={"detail": "Upload is too large"},
+                )
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def receive_wrapper():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised while the body is parsed, FastAPI turns it into the response
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="Upload is too large",
+                    )
+            return message
+
+        await self.app(scope, receive_wrapper, send)
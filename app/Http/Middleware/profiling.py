@@ -0,0 +1,30 @@
+from app.services.profiler import PROFILER
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware handing a sample of requests to the request profiler.
+    With profiling switched off it costs one attribute check per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILER.should_profile():
+            await self.app(scope, receive, send)
+            return
+
+        capture = PROFILER.start(scope["method"], scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                capture.status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            capture.route = getattr(route, "path", None)
+            await PROFILER.finish(capture)
@@ -0,0 +1,43 @@
+import json
+import time
+
+from app.utils.logger import logger
+
+
+class RequestLoggingMiddleware:
+    """
+    Pure ASGI access log: one structured record per request with method, path,
+    status and duration. Headers and query strings are never logged, they can carry
+    tokens. Unlike BaseHTTPMiddleware it does not wrap the response in another
+    task or stream, so streaming responses pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            client = scope.get("client")
+            logger.info(json.dumps({
+                "event": "request",
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "client": client[0] if client else None,
+            }))
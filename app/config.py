@@ -8,8 +8,33 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://dashscope-intl.aliyuncs.com/compatible-mode/v1")
+
+# Shared keep-alive pool used by every prebuilt QA chain
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_WARMUP = os.getenv("LLM_WARMUP", "true").lower() == "true"
 
 MYSQL_USER = os.getenv('MYSQL_USER')
 MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD')
 MYSQL_HOST = os.getenv('MYSQL_HOST')
-MYSQL_DATABASE = os.getenv('MYSQL_DATABASE')
\ No newline at end of file
+MYSQL_DATABASE = os.getenv('MYSQL_DATABASE')
+
+# Full SQLAlchemy URLs override the MySQL settings above (e.g. SQLite for local runs)
+DATABASE_URL = os.getenv("DATABASE_URL")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+# Connection pool, applied to the sync and the async engine
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Users allowed to use the admin endpoints, comma separated IDs
+ADMIN_USER_IDS = {int(value) for value in os.getenv("ADMIN_USER_IDS", "").split(",") if value.strip()}
+
+# Readiness probe: each dependency is checked at most once per TTL
+HEALTH_CHECK_TTL = float(os.getenv("HEALTH_CHECK_TTL", "10"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
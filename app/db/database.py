@@ -1,16 +1,55 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from urllib.parse import quote_plus
-from app.config import MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST, MYSQL_DATABASE
+from app.config import (
+    MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST, MYSQL_DATABASE,
+    DATABASE_URL, ASYNC_DATABASE_URL,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+)
 
-MYSQL_URL = f"mysql+pymysql://{MYSQL_USER}:{quote_plus(MYSQL_PASSWORD)}@{MYSQL_HOST}/{MYSQL_DATABASE}"
+MYSQL_URL = DATABASE_URL or f"mysql+pymysql://{MYSQL_USER}:{quote_plus(MYSQL_PASSWORD or '')}@{MYSQL_HOST}/{MYSQL_DATABASE}"
+ASYNC_MYSQL_URL = ASYNC_DATABASE_URL or f"mysql+aiomysql://{MYSQL_USER}:{quote_plus(MYSQL_PASSWORD or '')}@{MYSQL_HOST}/{MYSQL_DATABASE}"
 
-engine = create_engine(MYSQL_URL)
+
+def _pool_options(url: str) -> dict:
+    options = {"pool_pre_ping": DB_POOL_PRE_PING}
+    # SQLite (local runs, benchmarks) picks its own pool class
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return options
+
+
+# Sync engine for worker threads (ingestion, write-behind flushes)
+engine = create_engine(MYSQL_URL, **_pool_options(MYSQL_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for request handlers, so DB waits do not block the event loop
+async_engine = create_async_engine(ASYNC_MYSQL_URL, **_pool_options(ASYNC_MYSQL_URL))
+# Objects stay readable after commit, so handlers need no refresh round trip
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def close_engines():
+    """
+    Dispose both connection pools, e.g. from the application lifespan.
+    """
+    await async_engine.dispose()
+    engine.dispose()
@@ -0,0 +1,48 @@
+from sqlalchemy import inspect, text
+
+from app.db.database import async_engine
+from app.models.chat import ChatMessage, ChatSession
+from app.utils.logger import logger
+
+# Tables this service owns; columns and indexes added to their models since they were created
+UPGRADED_TABLES = (ChatSession.__table__, ChatMessage.__table__)
+
+
+def _upgrade(connection) -> list:
+    inspector = inspect(connection)
+    quote = connection.dialect.identifier_preparer.quote
+    changes = []
+    for table in UPGRADED_TABLES:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            # Only nullable columns can be added to a table that already has rows
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(
+                f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type} NULL"
+            ))
+            changes.append(f"{table.name}.{column.name}")
+
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(connection)
+                changes.append(index.name)
+    return changes
+
+
+async def ensure_schema():
+    """
+    Add the nullable columns and indexes the chat models gained to existing tables,
+    e.g. chat_sessions.summary and summary_message_id. Tables are not created here.
+    Returns what was added; running it again is a no-op.
+    """
+    async with async_engine.begin() as connection:
+        changes = await connection.run_sync(_upgrade)
+    if changes:
+        logger.info(f"Upgraded the chat schema: added {', '.join(changes)}")
+    return changes
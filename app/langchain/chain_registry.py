@@ -0,0 +1,113 @@
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import httpx
+from langchain_core.runnables import Runnable
+
+from app.utils.logger import logger
+
+ChainKey = Tuple[str, float, bool]
+
+
+class ChainRegistry:
+    """
+    Keeps prebuilt QA chains keyed by (model, temperature, streaming).
+    All chains share one sync and one async keep-alive HTTP pool, so requests
+    reuse open TLS connections to the LLM endpoint instead of opening new ones.
+    """
+
+    def __init__(
+        self,
+        builder: Callable[..., Runnable],
+        base_url: str,
+        api_key: Optional[str] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+    ):
+        """
+        :param builder: Callable(model, temperature, streaming, http_client, http_async_client) -> Runnable.
+        :param base_url: LLM endpoint, used for the warm-up request.
+        """
+        self.builder = builder
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._chains: Dict[ChainKey, Runnable] = {}
+        self._lock = threading.Lock()
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def http_client(self) -> httpx.Client:
+        if self._http_client is None:
+            self._http_client = httpx.Client(limits=self.limits)
+        return self._http_client
+
+    @property
+    def http_async_client(self) -> httpx.AsyncClient:
+        if self._http_async_client is None:
+            self._http_async_client = httpx.AsyncClient(limits=self.limits)
+        return self._http_async_client
+
+    def get(self, model: str, temperature: float, streaming: bool) -> Runnable:
+        """
+        Return the chain for the given settings, building it on first use.
+        """
+        key = (model, float(temperature), bool(streaming))
+        chain = self._chains.get(key)
+        if chain is not None:
+            return chain
+
+        with self._lock:
+            chain = self._chains.get(key)
+            if chain is None:
+                chain = self.builder(
+                    model=model,
+                    temperature=temperature,
+                    streaming=streaming,
+                    http_client=self.http_client,
+                    http_async_client=self.http_async_client,
+                )
+                self._chains[key] = chain
+                logger.info(f"Built QA chain for model={model} temperature={temperature} streaming={streaming}")
+        return chain
+
+    async def warm_up(self, keys: Optional[list[ChainKey]] = None) -> None:
+        """
+        Prebuild the given chains and open a pooled connection to the LLM endpoint,
+        so the first user request after a deploy does not pay for the TLS handshake.
+        """
+        for model, temperature, streaming in keys or []:
+            self.get(model, temperature, streaming)
+
+        try:
+            # Any response is fine, we only want the connection in the pool
+            await self.ping(timeout=10)
+        except Exception as exc:
+            logger.warning(f"LLM endpoint warm-up failed: {exc}")
+
+    async def ping(self, timeout: float = 10) -> int:
+        """
+        Request the endpoint's model list through the shared pool and return the HTTP status.
+        """
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        response = await self.http_async_client.get(f"{self.base_url}/models", headers=headers, timeout=timeout)
+        return response.status_code
+
+    async def aclose(self) -> None:
+        """
+        Drop cached chains and close the shared HTTP pools.
+        """
+        with self._lock:
+            self._chains.clear()
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+            self._http_async_client = None
+        if self._http_client is not None:
+            self._http_client.close()
+            self._http_client = None
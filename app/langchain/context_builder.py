@@ -0,0 +1,190 @@
+import math
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import tiktoken
+from langchain_core.documents import Document
+
+from app.utils.logger import logger
+
+_encoding = None
+
+# Between passages in the prompt context
+SEPARATOR = "\n\n"
+
+
+def load_tokenizer():
+    """
+    Load tiktoken's cl100k_base once. The first load may download the BPE file,
+    so the lifespan calls this in a thread before any request counts tokens.
+    Returns False when it cannot be loaded; counts then fall back to ~4 characters per token.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as exc:
+            logger.warning(f"Could not load the cl100k_base tokenizer, estimating token counts: {exc}")
+            _encoding = False
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count with tiktoken's cl100k_base, falling back to ~4 characters per token.
+    """
+    encoding = load_tokenizer()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def _overlap(left: str, right: str, max_chars: int) -> int:
+    """
+    Length of the longest suffix of `left` that is also a prefix of `right`.
+    """
+    for size in range(min(len(left), len(right), max_chars), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+@dataclass
+class BuiltContext:
+    text: str
+    chunks: List[Document] = field(default_factory=list)
+    tokens_used: int = 0
+    tokens_saved: int = 0
+
+
+class ContextBuilder:
+    """
+    Assembles the prompt context from retrieved chunks:
+    - orders candidates with MMR so near-duplicate hits do not crowd out other passages
+    - merges neighbouring chunks of the same page and removes their overlapping text
+    - fills up to a token budget
+    """
+
+    def __init__(self, token_budget: int = 1500, mmr_lambda: float = 0.7, min_overlap: int = 20, max_overlap: int = 400):
+        """
+        :param token_budget: Maximum tokens of context passed to the prompt.
+        :param mmr_lambda: 1 ranks purely by relevance, 0 purely by diversity.
+        :param min_overlap: Shorter shared spans are not treated as splitter overlap.
+        :param max_overlap: Longest overlap searched for, at least the splitter's chunk_overlap.
+        """
+        self.token_budget = int(token_budget)
+        self.mmr_lambda = float(mmr_lambda)
+        self.min_overlap = int(min_overlap)
+        self.max_overlap = int(max_overlap)
+
+    def build(
+        self,
+        query_vector: Sequence[float],
+        results: List[Tuple[Document, float, Optional[Sequence[float]]]],
+    ) -> BuiltContext:
+        """
+        :param query_vector: Embedding of the question.
+        :param results: (Document, score, vector) triples from the vector search.
+        """
+        tokens = {}
+
+        def tokens_of(piece):
+            if piece not in tokens:
+                tokens[piece] = count_tokens(piece)
+            return tokens[piece]
+
+        selected: List[Document] = []
+        text, tokens_used = "", 0
+        for doc in self._mmr_order(query_vector, results):
+            candidate = self._merge(selected + [doc])
+            # Cached per-passage counts rule out most candidates cheaply; tokens can merge
+            # across a separator, so one that fits is counted as the joined text
+            estimate = sum(tokens_of(piece) for piece in candidate) + tokens_of(SEPARATOR) * (len(candidate) - 1)
+            if estimate > self.token_budget:
+                continue
+            joined = SEPARATOR.join(candidate)
+            joined_tokens = count_tokens(joined)
+            if joined_tokens > self.token_budget:
+                continue
+            selected.append(doc)
+            text, tokens_used = joined, joined_tokens
+
+        raw = SEPARATOR.join(doc.page_content for doc in selected)
+        return BuiltContext(
+            text=text,
+            chunks=selected,
+            tokens_used=tokens_used,
+            tokens_saved=max(0, count_tokens(raw) - tokens_used) if raw else 0,
+        )
+
+    def _mmr_order(self, query_vector, results) -> List[Document]:
+        """
+        Rank all candidates by maximal marginal relevance.
+        Candidates without a vector fall back to their search score and no redundancy.
+        """
+        if not results:
+            return []
+
+        docs = [doc for doc, _, _ in results]
+        scores = np.array([score for _, score, _ in results], dtype=np.float32)
+        if any(vector is None for _, _, vector in results):
+            return [docs[i] for i in np.argsort(-scores, kind="stable")]
+
+        vectors = np.array([vector for _, _, vector in results], dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        query = np.array(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-12
+
+        relevance = vectors @ query
+        similarity = vectors @ vectors.T
+        redundancy = np.zeros(len(docs), dtype=np.float32)
+        remaining = list(range(len(docs)))
+        ordered = []
+        while remaining:
+            values = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * redundancy[remaining]
+            best = remaining.pop(int(np.argmax(values)))
+            ordered.append(docs[best])
+            redundancy = np.maximum(redundancy, similarity[best])
+        return ordered
+
+    def _merge(self, docs: List[Document]) -> List[str]:
+        """
+        Merge chunks of the same page into passages with overlapping text removed.
+        Passages keep the rank order of their best chunk.
+        """
+        groups = {}
+        for rank, doc in enumerate(docs):
+            key = (doc.metadata.get("document_uuid"), doc.metadata.get("source"), doc.metadata.get("page"))
+            groups.setdefault(key, []).append((rank, doc))
+
+        passages = []
+        for members in groups.values():
+            # Reading order when the splitter recorded positions, rank order otherwise
+            if all("start_index" in doc.metadata for _, doc in members):
+                members.sort(key=lambda member: member[1].metadata["start_index"])
+
+            merged: List[Tuple[int, str]] = []
+            for rank, doc in members:
+                text = doc.page_content
+                for i, (merged_rank, passage) in enumerate(merged):
+                    if text in passage:
+                        merged[i] = (min(rank, merged_rank), passage)
+                        break
+                    if passage in text:
+                        merged[i] = (min(rank, merged_rank), text)
+                        break
+                    size = _overlap(passage, text, self.max_overlap)
+                    if size >= self.min_overlap:
+                        merged[i] = (min(rank, merged_rank), passage + text[size:])
+                        break
+                    size = _overlap(text, passage, self.max_overlap)
+                    if size >= self.min_overlap:
+                        merged[i] = (min(rank, merged_rank), text + passage[size:])
+                        break
+                else:
+                    merged.append((rank, text))
+            passages.extend(merged)
+
+        passages.sort(key=lambda passage: passage[0])
+        return [text for _, text in passages]
@@ -0,0 +1,232 @@
+import asyncio
+import os
+from typing import Callable, Dict, Optional, Set
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import Runnable
+from langchain_openai import ChatOpenAI
+from sqlalchemy import select, update
+
+from app.config import OPENAI_API_KEY, LLM_BASE_URL
+from app.db.database import AsyncSessionLocal
+from app.langchain.context_builder import count_tokens
+from app.langchain.llm_metrics import LLMMetricsHandler
+from app.langchain.qa_chain import CHAIN_REGISTRY, DEFAULT_MODEL
+from app.models.chat import ChatMessage, ChatSession
+from app.services.chat_writer import CHAT_WRITER
+from app.utils.logger import logger
+
+# Prompt history: rolling summary plus the latest turns, within a fixed budget
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "800"))
+HISTORY_RECENT_MESSAGES = int(os.getenv("HISTORY_RECENT_MESSAGES", "10"))
+
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", DEFAULT_MODEL)
+SUMMARY_MAX_WORDS = int(os.getenv("SUMMARY_MAX_WORDS", "200"))
+
+SUMMARY_TEMPLATE = """
+    You maintain a running summary of a support conversation between a user and Maritime Connect.
+    Update the summary with the new messages below. Keep facts the assistant may need later:
+    the user's vessel, machinery, models, locations, problems, constraints and what was already advised.
+    Drop greetings and repetition. Write plain prose, at most {max_words} words, and return only the summary.
+
+    Current summary:
+    {summary}
+
+    New messages:
+    {messages}
+    """
+
+ROLE_LABELS = {"user": "User", "assistant": "Assistant"}
+
+
+def _message_line(role: str, content: str) -> str:
+    return f"{ROLE_LABELS.get(role, role or 'Message')}: {content}"
+
+
+# Prompt history of a conversation with nothing before the current question
+EMPTY_HISTORY = "None"
+
+
+def format_history(summary: Optional[str], messages, token_budget: int = HISTORY_TOKEN_BUDGET) -> str:
+    """
+    Render the prompt history: the rolling summary, then as many of the latest
+    messages (in chronological order) as fit the token budget.
+
+    :param messages: Rows with `role` and `content`, oldest first.
+    """
+    parts = []
+    remaining = token_budget
+    if summary:
+        summary_line = f"Summary of the earlier conversation: {summary}"
+        parts.append(summary_line)
+        remaining -= count_tokens(summary_line)
+
+    recent = []
+    for message in reversed(list(messages)):
+        line = _message_line(message.role, message.content)
+        tokens = count_tokens(line)
+        if tokens <= remaining:
+            recent.append(line)
+            remaining -= tokens
+            continue
+        if not recent and remaining > 0:
+            # Keep the start of an oversized latest message rather than nothing
+            recent.append(line[:len(line) * remaining // tokens] + " …")
+        break
+
+    parts.extend(reversed(recent))
+    return "\n".join(parts) if parts else EMPTY_HISTORY
+
+
+def build_summary_chain(model: str = SUMMARY_MODEL) -> Runnable:
+    prompt = PromptTemplate(
+        input_variables=["summary", "messages", "max_words"],
+        template=SUMMARY_TEMPLATE,
+    )
+    llm = ChatOpenAI(
+        model=model,
+        temperature=0,
+        streaming=False,
+        openai_api_key=OPENAI_API_KEY,
+        max_tokens=SUMMARY_MAX_WORDS * 3,
+        base_url=LLM_BASE_URL,
+        # Same keep-alive pool as the QA chains
+        http_client=CHAIN_REGISTRY.http_client,
+        http_async_client=CHAIN_REGISTRY.http_async_client,
+        callbacks=[LLMMetricsHandler("summary_llm")],
+    )
+    return prompt | llm | StrOutputParser()
+
+
+class ConversationSummarizer:
+    """
+    Folds older chat messages into ChatSession.summary in the background.
+    The latest `keep_recent` messages stay verbatim; once at least `fold_batch`
+    older messages are unsummarized they are merged into the summary with one
+    LLM call. Runs after the answer is sent, never on the request path.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        chain_factory: Callable[[], Runnable] = build_summary_chain,
+        keep_recent: int = 4,
+        fold_batch: int = 6,
+        max_fold: int = 40,
+        max_words: int = SUMMARY_MAX_WORDS,
+    ):
+        """
+        :param session_factory: Returns a new AsyncSession, e.g. AsyncSessionLocal.
+        :param chain_factory: Builds the summary chain on first use.
+        :param keep_recent: Newest messages never folded, the prompt shows them verbatim.
+        :param fold_batch: Minimum number of messages folded per LLM call.
+        :param max_fold: Maximum number of messages folded per LLM call.
+        :param max_words: Length limit given to the summarizer.
+        """
+        self.session_factory = session_factory
+        self.chain_factory = chain_factory
+        self.keep_recent = int(keep_recent)
+        self.fold_batch = int(fold_batch)
+        self.max_fold = int(max_fold)
+        self.max_words = int(max_words)
+        self._chain: Optional[Runnable] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._dirty: Set[str] = set()
+
+    @property
+    def chain(self) -> Runnable:
+        if self._chain is None:
+            self._chain = self.chain_factory()
+        return self._chain
+
+    def schedule(self, session_id: str) -> None:
+        """
+        Update the session's summary in the background. Calls for a session that
+        is already being summarized are coalesced into one more pass.
+        """
+        if session_id in self._tasks:
+            self._dirty.add(session_id)
+            return
+        self._tasks[session_id] = asyncio.get_running_loop().create_task(self._run(session_id))
+
+    async def _run(self, session_id: str):
+        try:
+            while True:
+                self._dirty.discard(session_id)
+                try:
+                    folded = await self.update(session_id)
+                except Exception as exc:
+                    logger.warning(f"Summarizing chat session {session_id} failed: {exc}")
+                    break
+                if not folded and session_id not in self._dirty:
+                    break
+        finally:
+            self._tasks.pop(session_id, None)
+            self._dirty.discard(session_id)
+
+    async def update(self, session_id: str) -> bool:
+        """
+        Fold one batch of messages into the summary. Returns whether anything was folded.
+        """
+        async with self.session_factory() as db:
+            session = (await db.execute(
+                select(ChatSession.summary, ChatSession.summary_message_id).where(ChatSession.id == session_id)
+            )).first()
+            if session is None:
+                return False
+            rows = (await db.execute(
+                select(ChatMessage.id, ChatMessage.role, ChatMessage.content)
+                .where(ChatMessage.session_id == session_id, ChatMessage.id > (session.summary_message_id or 0))
+                .order_by(ChatMessage.id)
+                .limit(self.max_fold + self.keep_recent)
+            )).all()
+
+        fold = rows[:max(0, len(rows) - self.keep_recent)]
+        if len(fold) < self.fold_batch:
+            return False
+
+        # No connection is held while the LLM runs
+        summary = (await self.chain.ainvoke({
+            "summary": session.summary or "None yet.",
+            "messages": "\n".join(_message_line(row.role, row.content) for row in fold),
+            "max_words": self.max_words,
+        })).strip()
+        if not summary:
+            return False
+
+        async with self.session_factory() as db:
+            # Skip the write if another worker already moved the summary on
+            previous = session.summary_message_id
+            result = await db.execute(
+                update(ChatSession)
+                .where(
+                    ChatSession.id == session_id,
+                    ChatSession.summary_message_id.is_(None) if previous is None
+                    else ChatSession.summary_message_id == previous,
+                )
+                .values(summary=summary, summary_message_id=fold[-1].id)
+            )
+            await db.commit()
+        return result.rowcount > 0
+
+    async def drain(self, timeout: float = 10) -> None:
+        """
+        Wait for running summaries, e.g. on shutdown, cancelling what is left after `timeout`.
+        """
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+
+CONVERSATION_SUMMARIZER = ConversationSummarizer(
+    AsyncSessionLocal,
+    keep_recent=int(os.getenv("SUMMARY_KEEP_RECENT", "4")),
+    fold_batch=int(os.getenv("SUMMARY_FOLD_BATCH", "6")),
+)
+
+# Summaries only see written messages, so update them after each flush
+CHAT_WRITER.add_flush_listener(CONVERSATION_SUMMARIZER.schedule)
@@ -0,0 +1,73 @@
+import time
+from typing import Any, Dict
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app.utils.metrics import LLM_TOKENS, UPSTREAM_ERRORS, record_stage
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    Records LLM latency, time to first token and token usage for every call of the
+    model it is attached to. One instance can serve concurrent calls, state is keyed by run ID.
+    """
+
+    def __init__(self, stage_name: str = "llm"):
+        """
+        :param stage_name: Stage label, e.g. "llm" for answers and "summary_llm" for summaries.
+        """
+        self.stage_name = stage_name
+        self._started: Dict[UUID, float] = {}
+        self._first_token: Dict[UUID, bool] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.get(run_id)
+        if started is not None and run_id not in self._first_token:
+            self._first_token[run_id] = True
+            record_stage(f"{self.stage_name}_first_token", time.perf_counter() - started)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        self._first_token.pop(run_id, None)
+        if started is not None:
+            record_stage(self.stage_name, time.perf_counter() - started)
+
+        model, prompt_tokens, completion_tokens = _usage(response)
+        if prompt_tokens:
+            LLM_TOKENS.inc(prompt_tokens, model=model, type="prompt")
+        if completion_tokens:
+            LLM_TOKENS.inc(completion_tokens, model=model, type="completion")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started.pop(run_id, None)
+        self._first_token.pop(run_id, None)
+        UPSTREAM_ERRORS.inc(upstream="llm", stage=self.stage_name)
+
+
+def _usage(response: LLMResult):
+    """
+    (model, prompt tokens, completion tokens) from either the API's token_usage
+    or the message usage metadata reported on streamed responses.
+    """
+    llm_output = response.llm_output or {}
+    model = llm_output.get("model_name", "")
+    usage = llm_output.get("token_usage") or {}
+    if usage:
+        return model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            metadata = getattr(message, "usage_metadata", None)
+            if metadata:
+                model = model or (message.response_metadata or {}).get("model_name", "")
+                return model, metadata.get("input_tokens", 0), metadata.get("output_tokens", 0)
+    return model, 0, 0
@@ -1,17 +1,39 @@
 from langchain_core.output_parsers import JsonOutputParser
-from app.services.embedding_model import EmbeddingModel
-from app.utils.qdrant_client import QdrantVectorDB
+from app.services.embedding_model import get_embedding_model
+from app.services.qdrant_vectordb import aget_vector_db, scope_filter
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import Runnable
 from langchain_openai import ChatOpenAI
+import httpx
 from pydantic import BaseModel, Field
-from app.config import OPENAI_API_KEY
+from dataclasses import dataclass
+import hashlib
+from app.config import (
+    OPENAI_API_KEY,
+    LLM_BASE_URL,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_KEEPALIVE_EXPIRY,
+)
+from app.langchain.chain_registry import ChainRegistry
+from app.langchain.context_builder import ContextBuilder
+from app.langchain.llm_metrics import LLMMetricsHandler
+from app.utils.metrics import stage
+from app.utils.logger import logger
 import os
 
 OWNER = os.getenv("QDRANT_COLLECTION", "maritime")
-EMBEDDING = EmbeddingModel().get()
 
-QDRANT = QdrantVectorDB(OWNER, EMBEDDING)
+CONTEXT_FETCH_K = int(os.getenv("CONTEXT_FETCH_K", "12"))
+CONTEXT_BUILDER = ContextBuilder(
+    token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500")),
+    mmr_lambda=float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7")),
+)
+
+DEFAULT_MODEL = "qwen-plus-latest"
+DEFAULT_TEMPERATURE = 1
+
+LLM_METRICS = LLMMetricsHandler("llm")
 
 class QAOutput(BaseModel):
     model_config = {
@@ -29,13 +51,7 @@ class QAOutput(BaseModel):
     followup_questions: list[str] = Field(description="Three relevant follow-up questions")
 
 
-async def get_qa_chain(
-    model: str = "qwen-plus-latest",
-    temperature: float = 1,
-    streaming: bool = True
-) -> Runnable:
-    
-    template = template = """
+QA_TEMPLATE = """
     You are Maritime Connect, an intelligent AI concierge designed to assist users in discovering trusted services anywhere in the world — from local professionals to global providers. Think of you as JustDial, Google Business, and Yelp combined with AI-powered precision.
 
     Your expertise spans all service domains, including:
@@ -90,24 +106,98 @@ async def get_qa_chain(
     Previous Chat History: {history}
     """
 
-    async def get_context(question: str) -> str:
-        results = QDRANT.similarity_search(question)
 
-        # Extract page_content from each Document and join
-        context_chunks = [doc.page_content for doc, _ in results]
-        return "\n\n".join(context_chunks)
+class TimedJsonOutputParser(JsonOutputParser):
+    """
+    JsonOutputParser that records the final parse as the "parse" stage.
+    Incremental parses while streaming are not timed.
+    """
+
+    def parse_result(self, result, *, partial: bool = False):
+        if partial:
+            return super().parse_result(result, partial=True)
+        with stage("parse"):
+            return super().parse_result(result)
+
+
+@dataclass
+class RetrievedContext:
+    """
+    Context chunks retrieved for one question.
+    """
+    text: str
+    query_vector: list[float]
+    chunk_ids: list[str]
+    document_uuids: set[str]
+    tokens_used: int = 0
+    tokens_saved: int = 0
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Stable hash of the retrieved chunk IDs, independent of their order.
+        """
+        return hashlib.sha256("|".join(sorted(self.chunk_ids)).encode("utf-8")).hexdigest()
+
+
+async def retrieve_context(question: str, scope: dict | None = None) -> RetrievedContext:
+    """
+    :param scope: Optional manual fields (see SCOPE_FIELDS) the search is restricted to,
+                  applied as an indexed payload filter.
+    """
+    # Embed asynchronously (micro-batched with concurrent questions)
+    with stage("embed", upstream="embedding"):
+        query_vector = await get_embedding_model().aembed_query(question)
+
+    # Over-fetch, then let the builder dedupe, diversify and fit the token budget
+    with stage("search", upstream="qdrant"):
+        vector_db = await aget_vector_db(OWNER)
+        results = await vector_db.asimilarity_search_with_vectors(
+            query_vector, k=CONTEXT_FETCH_K, query_filter=scope_filter(scope)
+        )
+    with stage("context"):
+        built = CONTEXT_BUILDER.build(query_vector, results)
+    logger.info(f"Context: {len(built.chunks)}/{len(results)} chunks, {built.tokens_used} tokens, saved {built.tokens_saved}")
+
+    return RetrievedContext(
+        text=built.text,
+        query_vector=query_vector,
+        chunk_ids=[str(doc.metadata.get("_id")) for doc in built.chunks],
+        document_uuids={doc.metadata["document_uuid"] for doc in built.chunks if doc.metadata.get("document_uuid")},
+        tokens_used=built.tokens_used,
+        tokens_saved=built.tokens_saved,
+    )
 
 
-    async def chain_with_context(inputs: dict) -> dict:
-        context = await get_context(inputs["question"])
-        return {**inputs, "context": context}
+async def get_context(question: str, scope: dict | None = None) -> str:
+    return (await retrieve_context(question, scope)).text
 
+
+async def chain_with_context(inputs: dict) -> dict:
+    # Callers that already retrieved the context (e.g. for the answer cache) pass it in
+    if "context" in inputs:
+        return inputs
+    context = await get_context(inputs["question"], inputs.get("scope"))
+    return {**inputs, "context": context}
+
+
+def build_qa_chain(
+    model: str = DEFAULT_MODEL,
+    temperature: float = DEFAULT_TEMPERATURE,
+    streaming: bool = True,
+    http_client: httpx.Client | None = None,
+    http_async_client: httpx.AsyncClient | None = None,
+) -> Runnable:
+    """
+    Build the retrieval → prompt → LLM → JSON parser chain.
+    Prefer `CHAIN_REGISTRY.get` so the chain and its HTTP pool are reused.
+    """
     prompt = PromptTemplate(
         input_variables=["question", "history", "context"],
-        template=template
+        template=QA_TEMPLATE
     )
 
-    parser = JsonOutputParser(pydantic_schema=QAOutput)
+    parser = TimedJsonOutputParser(pydantic_schema=QAOutput)
 
     llm = ChatOpenAI(
         model=model,
@@ -118,7 +208,12 @@ async def get_qa_chain(
         top_p=1,
         presence_penalty=0.1,
         frequency_penalty=0.1,
-        base_url="https://dashscope-intl.aliyuncs.com/compatible-mode/v1",
+        base_url=LLM_BASE_URL,
+        http_client=http_client,
+        http_async_client=http_async_client,
+        # Token usage is also reported for streamed answers
+        stream_usage=True,
+        callbacks=[LLM_METRICS],
     )
 
     chain = (
@@ -129,3 +224,24 @@ async def get_qa_chain(
     )
     
     return chain
+
+
+CHAIN_REGISTRY = ChainRegistry(
+    build_qa_chain,
+    base_url=LLM_BASE_URL,
+    api_key=OPENAI_API_KEY,
+    max_connections=LLM_MAX_CONNECTIONS,
+    max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+)
+
+
+async def get_qa_chain(
+    model: str = DEFAULT_MODEL,
+    temperature: float = DEFAULT_TEMPERATURE,
+    streaming: bool = True
+) -> Runnable:
+    """
+    Return the shared, prebuilt QA chain for these settings.
+    """
+    return CHAIN_REGISTRY.get(model, temperature, streaming)
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, Integer, String, Text, JSON, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, JSON, DateTime, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -12,10 +12,18 @@ class ChatSession(Base):
     user_id = Column(String(50))
     title = Column(String(255))
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Rolling summary of every message up to and including summary_message_id
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
     messages = relationship("ChatMessage", back_populates="session",
         cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        # Keyset pagination of a user's sessions, newest first
+        Index("ix_chat_sessions_user_created", "user_id", "created_at", "id"),
+    )
+
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
 
@@ -33,4 +41,9 @@ class ChatMessage(Base):
     followup_questions = Column(JSON, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    session = relationship("ChatSession", back_populates="messages")
\ No newline at end of file
+    session = relationship("ChatSession", back_populates="messages")
+
+    __table_args__ = (
+        # Keyset pagination of a session's messages and the recent-history lookup
+        Index("ix_chat_messages_session_id", "session_id", "id"),
+    )
\ No newline at end of file
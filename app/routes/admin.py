@@ -0,0 +1,44 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field
+
+from app.Http.Middleware.authenticate import require_admin
+from app.services.profiler import PROFILER
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+class ProfilingSettings(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = Field(None, ge=0, le=1)
+    slow_ms: Optional[float] = Field(None, ge=0)
+    interval_ms: Optional[float] = Field(None, ge=1)
+
+
+@router.get("/profiling")
+async def profiling_status():
+    return PROFILER.stats()
+
+
+@router.post("/profiling")
+async def configure_profiling(settings: ProfilingSettings):
+    """
+    Switch request profiling on or off and adjust sampling; omitted fields keep their value.
+    """
+    PROFILER.configure(**settings.model_dump())
+    return PROFILER.stats()
+
+
+@router.get("/profiling/profiles")
+async def list_profiles():
+    return {"profiles": PROFILER.store.list()}
+
+
+@router.get("/profiling/profiles/{name}")
+async def download_profile(name: str):
+    path = PROFILER.store.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=name)
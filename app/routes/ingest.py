@@ -1,46 +1,197 @@
 import os
-from fastapi import APIRouter, UploadFile, Form, HTTPException
-from app.services.document_loader import DocumentLoader
-from app.services.text_splitter import TextSplitter
-from app.services.embedding_model import EmbeddingModel
-from app.services.qdrant_vectordb import QdrantVectorDB
+from fastapi import APIRouter, Depends, UploadFile, Form, HTTPException, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from app.db.database import AsyncSessionLocal
+from app.models.manual import Manual
+from app.services.answer_cache import ANSWER_CACHE
+from app.Http.Middleware.authenticate import authenticate, require_admin
+from app.services.ingest_jobs import DocumentBusyError, IngestJobManager, JobQueueFullError, JobStateError
+from app.services.ingest_pipeline import IngestPipeline
+from app.services.qdrant_vectordb import SCOPE_FIELDS, aget_vector_db
+from app.services.uploads import UploadTooLargeError, discard_file, save_upload
+from app.utils.logger import logger
 
 router = APIRouter(prefix="/ingest", tags=["Ingestion"])
 
-# Initialize embedding and vector DB service
-embedding_model = EmbeddingModel().get()
+COLLECTION = os.getenv("QDRANT_COLLECTION", "maritime")
+UPLOAD_DIR = os.getenv("INGEST_UPLOAD_DIR", "storage/uploads")
+MAX_UPLOAD_BYTES = int(float(os.getenv("INGEST_MAX_UPLOAD_MB", "300")) * 1024 * 1024)
+# Whole request body, i.e. the file plus the multipart framing and the uuid field
+MAX_UPLOAD_BODY_BYTES = MAX_UPLOAD_BYTES + 64 * 1024
 
-@router.post("/new")
+def _invalidate_answers(job):
+    # Cached answers built on the previous revision are stale now
+    ANSWER_CACHE.invalidate_document(job.document_uuid)
+
+
+async def _manual_scope(uuid: str) -> dict:
+    """
+    Scope fields of the manual, copied into every chunk's payload.
+    Every field is present (None when empty) so a re-ingest clears stale values.
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            manual = (await db.execute(select(Manual).where(Manual.uuid == uuid))).scalars().first()
+    except Exception as e:
+        logger.warning(f"Could not load manual {uuid} for payload scope: {e}")
+        return {}
+
+    if manual is None:
+        logger.warning(f"No manual with uuid {uuid}; ingesting without scope fields")
+        return {}
+    scope = {}
+    for name in SCOPE_FIELDS:
+        value = getattr(manual, name)
+        if isinstance(value, str):
+            value = value.strip() or None
+        scope[name] = value
+    return scope
+
+
+def _busy_document(active, content_sha256: str):
+    """
+    Answer for an upload of a document that is already being ingested: the running
+    job for the same file, or a conflict for a different one.
+    """
+    if active.content_sha256 == content_sha256:
+        return active.to_dict()
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Manual is already being ingested by job {active.id}; retry once it has finished",
+    )
+
+
+INGEST_JOBS = IngestJobManager(
+    IngestPipeline(
+        collection_name=COLLECTION,
+        batch_size=int(os.getenv("INGEST_BATCH_SIZE", "64")),
+        queue_depth=int(os.getenv("INGEST_QUEUE_DEPTH", "4")),
+        on_complete=_invalidate_answers,
+    ),
+    max_workers=int(os.getenv("INGEST_WORKERS", "2")),
+    max_pending=int(os.getenv("INGEST_MAX_PENDING", "20")),
+)
+
+
+@router.post("/new", status_code=status.HTTP_202_ACCEPTED)
 async def ingest_manual(uuid: str = Form(...), file: UploadFile = Form(...)):
     """
-    Ingest a manual PDF into Qdrant.
+    Queue a manual PDF for ingestion into Qdrant.
     - User sends `uuid` and `file` (PDF).
-    - No database is queried.
+    - The upload is copied to disk and hashed; a re-upload of a fully ingested file is skipped.
+    - The body size is capped by BodySizeLimitMiddleware while it is received,
+      Starlette has already read the whole body by the time this runs.
+    - The manual's machine_name, model_no, machine_type and vendor_id are copied
+      into every chunk's payload so questions can be scoped to them.
+    - Returns a job ID right away; poll `/ingest/jobs/{job_id}` for progress.
+    - One job per manual at a time: a different file for a manual that is still
+      being ingested is refused with 409.
     """
     try:
-        # Save uploaded file temporarily
-        temp_path = f"/tmp/{uuid}_{file.filename}"
-        with open(temp_path, "wb") as f:
-            f.write(await file.read())
+        temp_path, content_sha256, _ = await save_upload(file, UPLOAD_DIR, MAX_UPLOAD_BYTES)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except Exception:
+        logger.exception(f"Saving the upload of manual {uuid} failed")
+        raise HTTPException(status_code=500, detail="Manual ingestion failed.")
+
+    try:
+        active = INGEST_JOBS.find_active(uuid)
+        if active is not None:
+            discard_file(temp_path)
+            return _busy_document(active, content_sha256)
 
-        # Initialize pipeline services
-        loader = DocumentLoader()
-        splitter = TextSplitter()
-        vector_db = QdrantVectorDB(collection_name=os.getenv("QDRANT_COLLECTION", "maritime"), embeddings=embedding_model)
+        scope = await _manual_scope(uuid)
+        vector_db = await aget_vector_db(COLLECTION)
+        if await run_in_threadpool(vector_db.has_document_content, uuid, content_sha256):
+            discard_file(temp_path)
+            # The manual's fields may have been edited without changing the file
+            if scope:
+                await run_in_threadpool(vector_db.set_document_metadata, uuid, scope)
+            return JSONResponse(
+                status_code=status.HTTP_200_OK,
+                content={"uuid": uuid, "content_sha256": content_sha256, "scope": scope, "status": "unchanged"},
+            )
 
-        # Load → Split
-        docs = loader.load(temp_path)
-        chunks = splitter.split(docs)
+        job = INGEST_JOBS.submit(uuid, temp_path, content_sha256=content_sha256, scope=scope)
+    except DocumentBusyError as e:
+        # Another upload of this manual was queued while this one was checked
+        discard_file(temp_path)
+        return _busy_document(e.job, content_sha256)
+    except JobQueueFullError as e:
+        discard_file(temp_path)
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+    except Exception:
+        discard_file(temp_path)
+        logger.exception(f"Queueing the ingestion of manual {uuid} failed")
+        raise HTTPException(status_code=500, detail="Manual ingestion failed.")
 
-        # Add chunks to Qdrant using provided UUID
-        vector_db.add_documents(chunks, document_uuid=uuid)
+    return job.to_dict()
 
-        return {
-            "uuid": uuid,
-            "chunks_added": len(chunks),
-            "status": "ingested"
-        }
 
-    except Exception as e:
-        print(e)
-        raise HTTPException(status_code=500, detail="Manual ingestion failed.")
+def _get_job_or_404(job_id: str):
+    job = INGEST_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}", dependencies=[Depends(authenticate)])
+async def get_ingest_job(job_id: str):
+    """
+    Status and progress of an ingestion job.
+    """
+    return _get_job_or_404(job_id).to_dict()
+
+
+@router.post("/jobs/{job_id}/cancel", dependencies=[Depends(require_admin)])
+async def cancel_ingest_job(job_id: str):
+    """
+    Stop a queued or running job after its current batch. Admins only.
+    """
+    _get_job_or_404(job_id)
+    try:
+        return INGEST_JOBS.cancel(job_id).to_dict()
+    except JobStateError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.post("/jobs/{job_id}/retry", dependencies=[Depends(require_admin)])
+async def retry_ingest_job(job_id: str):
+    """
+    Re-queue a failed job; only batches that did not succeed are processed again. Admins only.
+    """
+    _get_job_or_404(job_id)
+    try:
+        return INGEST_JOBS.retry(job_id).to_dict()
+    except (JobStateError, DocumentBusyError) as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+
+
+@router.delete("/{uuid}", dependencies=[Depends(require_admin)])
+async def delete_manual(uuid: str):
+    """
+    Remove every vector of a manual with one filtered delete. Admins only.
+    Refused with 409 while the manual is being ingested, the job would write its points back.
+    """
+    active = INGEST_JOBS.find_active(uuid)
+    if active is not None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Manual is being ingested by job {active.id}; cancel it first",
+        )
+
+    try:
+        vector_db = await aget_vector_db(COLLECTION)
+        deleted = await run_in_threadpool(vector_db.count_document_points, uuid)
+        await run_in_threadpool(vector_db.delete_document, uuid)
+    except Exception:
+        logger.exception(f"Deleting manual {uuid} failed")
+        raise HTTPException(status_code=500, detail="Manual deletion failed.")
+
+    ANSWER_CACHE.invalidate_document(uuid)
+    return {"uuid": uuid, "points_deleted": deleted, "status": "deleted"}
@@ -1,134 +1,426 @@
-from fastapi import APIRouter, HTTPException, Form, Depends
-from langchain_core.messages import HumanMessage, AIMessage
+from fastapi import APIRouter, HTTPException, Form, Depends, Query
+from fastapi.responses import StreamingResponse
 from app.Http.Middleware.authenticate import authenticate
 from app.models.chat import ChatSession, ChatMessage
-from app.langchain.qa_chain import get_qa_chain
-from sqlalchemy.orm import Session
-from app.db.database import get_db
+from app.langchain.qa_chain import get_qa_chain, retrieve_context, RetrievedContext
+from app.langchain.conversation import EMPTY_HISTORY, HISTORY_RECENT_MESSAGES, format_history
+from app.services.answer_cache import ANSWER_CACHE, ANSWER_CACHE_ENABLED
+from app.services.token_cache import TOKEN_CACHE
+from app.services.chat_writer import CHAT_WRITER
+from app.services.single_flight import ANSWER_FLIGHTS, SINGLE_FLIGHT_ENABLED, normalize_question
+from app.services.embedding_model import get_embedding_model
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_async_db
 from app.models.user import User
-from sqlalchemy import desc
-from uuid import UUID
+from sqlalchemy import and_, desc, or_, select
+from app.utils.metrics import record_stage, stage
+from app.utils.pagination import decode_cursor, encode_cursor
+from datetime import datetime
+from typing import Optional
+from uuid import UUID, uuid4
+import hashlib
 import json
+import time
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def retrieval_scope(
+    machine_name: Optional[str] = Form(None),
+    model_no: Optional[str] = Form(None),
+    machine_type: Optional[str] = Form(None),
+    vendor_id: Optional[int] = Form(None),
+    document_uuid: Optional[str] = Form(None),
+) -> dict:
+    """
+    Optional filters restricting retrieval to matching manuals.
+    """
+    scope = {
+        "machine_name": machine_name,
+        "model_no": model_no,
+        "machine_type": machine_type,
+        "vendor_id": vendor_id,
+        "document_uuid": document_uuid,
+    }
+    # Blank form fields mean "no filter"
+    return {
+        name: value.strip() if isinstance(value, str) else value
+        for name, value in scope.items()
+        if value is not None and value != "" and not (isinstance(value, str) and value.isspace())
+    }
+
 @router.post("/chat/new")
-async def create_chat(question: str = Form(...), user: User = Depends(authenticate), db: Session = Depends(get_db)):
-    chat_session = ChatSession(user_id=user.id, title=question)
+async def create_chat(question: str = Form(...), user: User = Depends(authenticate), db: AsyncSession = Depends(get_async_db)):
+    chat_session = ChatSession(id=str(uuid4()), user_id=user.id, title=question)
     db.add(chat_session)
-    db.commit()
-    db.refresh(chat_session)
+    await db.commit()
     return {"session_id": chat_session.id, "title": chat_session.title}
 
 @router.get("/chats")
-async def get_chats(db: Session = Depends(get_db), user: User = Depends(authenticate)):
-    sessions = db.query(ChatSession).filter(ChatSession.user_id == user.id).all()
-    
-    return {"sessions": sessions}
+async def get_chats(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(authenticate),
+):
+    """
+    The user's sessions, newest first. Pass `next_cursor` back as `cursor` for the next page.
+    """
+    query = (
+        select(ChatSession.id, ChatSession.title, ChatSession.created_at)
+        .where(ChatSession.user_id == str(user.id))
+        .order_by(desc(ChatSession.created_at), desc(ChatSession.id))
+        .limit(limit + 1)
+    )
+    if cursor:
+        created_at, session_id = decode_cursor(cursor, datetime, str)
+        query = query.where(or_(
+            ChatSession.created_at < created_at,
+            and_(ChatSession.created_at == created_at, ChatSession.id < session_id),
+        ))
 
+    rows = (await db.execute(query)).all()
+    page = rows[:limit]
+    return {
+        "sessions": [{"id": row.id, "title": row.title, "created_at": row.created_at} for row in page],
+        "next_cursor": encode_cursor(page[-1].created_at, page[-1].id) if len(rows) > limit else None,
+    }
 
-@router.post("/chat/{session_id}/ask")
-async def ask_question(
-    session_id: str,
-    question: str = Form(...),
-    db: Session = Depends(get_db),
-    user: User = Depends(authenticate)
-):
+
+async def _load_session_history(session_id: str, user: User, db: AsyncSession) -> str:
+    """
+    Validate the session belongs to the user and return the prompt history:
+    the rolling summary plus the latest messages within HISTORY_TOKEN_BUDGET.
+    """
     # Validate UUID format (optional but cleaner)
     try:
         uuid_obj = UUID(session_id)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid session ID format")
 
-    # Get chat session
-    session = db.query(ChatSession).filter(ChatSession.id == str(uuid_obj), ChatSession.user_id == user.id).first()
+    with stage("history", upstream="mysql"):
+        # Get chat session
+        session = (await db.execute(
+            select(ChatSession.summary, ChatSession.summary_message_id)
+            .where(ChatSession.id == str(uuid_obj), ChatSession.user_id == str(user.id))
+        )).first()
+
+        # Only messages the summary does not cover yet
+        messages = (await db.execute(
+            select(ChatMessage.role, ChatMessage.content)
+            .where(ChatMessage.session_id == session_id, ChatMessage.id > (session.summary_message_id or 0))
+            .order_by(desc(ChatMessage.id))
+            .limit(HISTORY_RECENT_MESSAGES)
+        )).all() if session else []
+        # End the read transaction so no pooled connection is held during the LLM call
+        await db.rollback()
+
     if not session:
         raise HTTPException(status_code=404, detail="Chat session not found")
-    
-    # Get recent history for LLM context only (not for response)
-    messages = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.session_id == session_id)
-        .order_by(desc(ChatMessage.created_at))
-        .limit(10)
-        .all()
+
+    # Messages still queued for writing are the newest ones
+    messages = list(reversed(messages)) + CHAT_WRITER.pending(session_id)
+    return format_history(session.summary, messages[-HISTORY_RECENT_MESSAGES:])
+
+
+def safe_json(value):
+    if not value:
+        return []
+    try:
+        return json.loads(value) if isinstance(value, str) else value
+    except:
+        return []
+
+
+def _message_payload(msg: ChatMessage) -> dict:
+    return {
+        # id is None until the write-behind queue has inserted the row
+        "id": msg.id,
+        "uuid": msg.uuid,
+        "role": msg.role,
+        "content": msg.content,
+        "advice_points": safe_json(msg.advice_points),
+        "followup_questions": safe_json(msg.followup_questions),
+        "timestamp": msg.created_at,
+    }
+
+
+def _assistant_message(session_id: str, result: dict) -> ChatMessage:
+    return CHAT_WRITER.new_message(
+        session_id,
+        "assistant",
+        result.get("summary", ""),
+        advice_points=result.get("advice_points", []),
+        followup_questions=result.get("followup_questions", []),
     )
 
-    chat_history = []
-    for msg in messages:
-        if msg.role == "user":
-            chat_history.append(HumanMessage(content=msg.content))
-        elif msg.role == "assistant":
-            chat_history.append(AIMessage(content=msg.content))
 
-    # Store user query
-    user_msg = ChatMessage(session_id=session_id, role="user", content=question)
-    db.add(user_msg)
-    db.commit()
-    db.refresh(user_msg)
+@router.get("/chat/cache/stats")
+async def get_cache_stats(user: User = Depends(authenticate)):
+    """
+    Hit ratios and saved latency, for tuning ANSWER_CACHE_THRESHOLD.
+    """
+    document_store = get_embedding_model().document_store
+    return {
+        "answer_cache": ANSWER_CACHE.stats(),
+        "query_embedding_cache": get_embedding_model().query_cache.stats(),
+        # None when EMBEDDING_STORE_PATH is empty
+        "document_embedding_store": document_store.stats() if document_store else None,
+        "auth_token_cache": TOKEN_CACHE.stats(),
+        "chat_writer": CHAT_WRITER.stats(),
+        "single_flight": ANSWER_FLIGHTS.stats(),
+    }
+
+
+@router.post("/chat/{session_id}/ask")
+async def ask_question(
+    session_id: str,
+    question: str = Form(...),
+    scope: dict = Depends(retrieval_scope),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(authenticate)
+):
+    chat_history = await _load_session_history(session_id, user, db)
+
+    # Written together with the answer, off the response path
+    user_msg = CHAT_WRITER.new_message(session_id, "user", question)
 
-    # Get LLM response
+    # Get LLM response, unless a near-duplicate question over the same context is cached
     try:
-        chain = await get_qa_chain()
-        result = await chain.ainvoke({
-            "question": question,
-            "history": chat_history
-        })
+        context = await retrieve_context(question, scope)
+        result = _cached_answer(context, chat_history)
+        if result is None:
+            with stage("generate"):
+                result = await _generate_answer(question, chat_history, context)
     except Exception as e:
+        CHAT_WRITER.enqueue(user_msg)
         return {"error": "Invalid response format from AI", "raw_output": str(e)}
 
-    summary = result.get("summary", "")
-    advice_points = result.get("advice_points", [])
-    followup_questions = result.get("followup_questions", [])
-
-    # Store assistant response
-    assistant_msg = ChatMessage(
-        session_id=session_id,
-        role="assistant",
-        content=summary,
-        advice_points=json.dumps(advice_points) if advice_points else None,
-        followup_questions=json.dumps(followup_questions) if followup_questions else None
-    )
-    db.add(assistant_msg)
-    db.commit()
-    db.refresh(assistant_msg)
-
-    def safe_json(value):
-        if not value:
-            return []
-        try:
-            return json.loads(value) if isinstance(value, str) else value
-        except:
-            return []
+    # Store both messages in one background transaction
+    assistant_msg = _assistant_message(session_id, result)
+    CHAT_WRITER.enqueue(user_msg, assistant_msg)
 
     return {
         "session_id": session_id,
         "messages": [
-            {
-                "id": user_msg.id,
-                "role": user_msg.role,
-                "content": user_msg.content,
-                "advice_points": [],
-                "followup_questions": [],
-                "timestamp": user_msg.created_at,
-            },
-            {
-                "id": assistant_msg.id,
-                "role": assistant_msg.role,
-                "content": assistant_msg.content,
-                "advice_points": safe_json(assistant_msg.advice_points),
-                "followup_questions": safe_json(assistant_msg.followup_questions),
-                "timestamp": assistant_msg.created_at,
-            }
+            {**_message_payload(user_msg), "advice_points": [], "followup_questions": []},
+            _message_payload(assistant_msg),
         ]
     }
 
 
+def _shareable(chat_history: str) -> bool:
+    # Answers built on a conversation can carry its private details (vessel,
+    # location, ...); only answers depending on the documents alone are shared
+    return chat_history == EMPTY_HISTORY
+
+
+def _cached_answer(context: RetrievedContext, chat_history: str) -> Optional[dict]:
+    if not ANSWER_CACHE_ENABLED or not _shareable(chat_history):
+        return None
+    with stage("answer_cache"):
+        return ANSWER_CACHE.lookup(context.query_vector, context.fingerprint)
+
+
+def _remember_answer(context: RetrievedContext, chat_history: str, result: dict, generation_seconds: float) -> None:
+    # Only answers grounded in retrieved chunks can be invalidated on re-ingest
+    if ANSWER_CACHE_ENABLED and _shareable(chat_history) and context.chunk_ids and isinstance(result, dict) and result.get("summary"):
+        ANSWER_CACHE.store(
+            context.query_vector,
+            context.fingerprint,
+            context.document_uuids,
+            result,
+            generation_seconds,
+        )
+
+
+def _flight_key(mode: str, question: str, chat_history: str, context: RetrievedContext) -> tuple:
+    # The history is part of the prompt and private to its session, so only
+    # askers with the same history (usually none) share a call
+    history_hash = hashlib.sha256(chat_history.encode("utf-8")).hexdigest()
+    return mode, normalize_question(question), history_hash, context.fingerprint
+
+
+async def _generate_answer(question: str, chat_history: str, context: RetrievedContext) -> dict:
+    """
+    Run the QA chain. Concurrent identical questions (same normalized text and
+    conversation history over the same retrieved context) share one LLM call.
+    """
+    async def call():
+        started = time.perf_counter()
+        chain = await get_qa_chain()
+        result = await chain.ainvoke({"question": question, "history": chat_history, "context": context.text})
+        _remember_answer(context, chat_history, result, time.perf_counter() - started)
+        return result
+
+    if not SINGLE_FLIGHT_ENABLED:
+        return await call()
+    result, _ = await ANSWER_FLIGHTS.run(_flight_key("invoke", question, chat_history, context), call)
+    return result
+
+
+def _stream_answer(question: str, chat_history: str, context: RetrievedContext):
+    """
+    Streaming variant of `_generate_answer`, yielding partial answers.
+    """
+    async def call():
+        started = time.perf_counter()
+        chain = await get_qa_chain()
+        result = None
+        async for partial in chain.astream({"question": question, "history": chat_history, "context": context.text}):
+            result = partial
+            yield partial
+        _remember_answer(context, chat_history, result, time.perf_counter() - started)
+
+    if not SINGLE_FLIGHT_ENABLED:
+        return call()
+    return (partial async for partial, _ in ANSWER_FLIGHTS.stream(_flight_key("stream", question, chat_history, context), call))
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _once(value):
+    yield value
+
+
+STREAMED_LIST_EVENTS = (
+    ("advice_points", "advice_point"),
+    ("followup_questions", "followup_question"),
+)
+
+
+@router.post("/chat/{session_id}/ask/stream")
+async def ask_question_stream(
+    session_id: str,
+    question: str = Form(...),
+    scope: dict = Depends(retrieval_scope),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(authenticate)
+):
+    """
+    Server-sent-events variant of /ask.
+    Emits `start`, then `summary` deltas and each finished `advice_point` /
+    `followup_question` as the incremental JSON parser produces them, then `done`
+    with the assistant message, which is written behind the response.
+    """
+    chat_history = await _load_session_history(session_id, user, db)
+
+    user_msg = CHAT_WRITER.new_message(session_id, "user", question)
+    user_payload = {**_message_payload(user_msg), "advice_points": [], "followup_questions": []}
+
+    async def event_stream():
+        stored = False
+        try:
+            yield _sse("start", {"session_id": session_id, "message": user_payload})
+
+            sent_summary = ""
+            sent_items = {field: 0 for field, _ in STREAMED_LIST_EVENTS}
+            result = {}
+            try:
+                context = await retrieve_context(question, scope)
+                cached = _cached_answer(context, chat_history)
+                if cached is not None:
+                    partials = _once(cached)
+                else:
+                    started = time.perf_counter()
+                    partials = _stream_answer(question, chat_history, context)
+
+                async for partial in partials:
+                    if not isinstance(partial, dict):
+                        continue
+                    result = partial
+
+                    summary = partial.get("summary")
+                    if isinstance(summary, str) and len(summary) > len(sent_summary) and summary.startswith(sent_summary):
+                        yield _sse("summary", {"delta": summary[len(sent_summary):]})
+                        sent_summary = summary
+
+                    keys = list(partial)
+                    for field, event in STREAMED_LIST_EVENTS:
+                        items = partial.get(field)
+                        if not isinstance(items, list):
+                            continue
+                        # The last item may still be growing until a later key shows up
+                        finished = len(items) if keys[-1] != field else len(items) - 1
+                        while sent_items[field] < finished:
+                            index = sent_items[field]
+                            yield _sse(event, {"index": index, "text": items[index]})
+                            sent_items[field] += 1
+            except Exception as e:
+                yield _sse("error", {"error": "Invalid response format from AI", "raw_output": str(e)})
+                return
+
+            if cached is None:
+                record_stage("generate", time.perf_counter() - started)
+
+            # Flush whatever was still open when the stream ended
+            for field, event in STREAMED_LIST_EVENTS:
+                items = result.get(field) or []
+                while sent_items[field] < len(items):
+                    index = sent_items[field]
+                    yield _sse(event, {"index": index, "text": items[index]})
+                    sent_items[field] += 1
+
+            assistant_msg = _assistant_message(session_id, result)
+            CHAT_WRITER.enqueue(user_msg, assistant_msg)
+            stored = True
+            yield _sse("done", {"session_id": session_id, "message": _message_payload(assistant_msg)})
+        finally:
+            # Failed or disconnected streams still keep the question
+            if not stored:
+                CHAT_WRITER.enqueue(user_msg)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/chat/{session_id}/history")
-async def get_chat_history(session_id: str, db: Session = Depends(get_db), user: User = Depends(authenticate)):
-    messages = db.query(ChatMessage).filter(
-        ChatMessage.session_id == session_id
-    ).order_by(ChatMessage.id).all()
+async def get_chat_history(
+    session_id: str,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(authenticate),
+):
+    """
+    One page of a session's messages in chronological order, starting with the latest.
+    Pass `next_cursor` back as `cursor` to load the older messages before this page.
+    The first page also includes messages still queued for writing (their `id` is None).
+    """
+    # Ownership check and page in one query: the outer join keeps a row for an empty session
+    message_filter = ChatMessage.session_id == ChatSession.id
+    if cursor:
+        (before_id,) = decode_cursor(cursor, int)
+        message_filter = and_(message_filter, ChatMessage.id < before_id)
+    rows = (await db.execute(
+        select(
+            ChatMessage.id,
+            ChatMessage.uuid,
+            ChatMessage.role,
+            ChatMessage.content,
+            ChatMessage.advice_points,
+            ChatMessage.followup_questions,
+            ChatMessage.created_at,
+        )
+        .select_from(ChatSession)
+        .outerjoin(ChatMessage, message_filter)
+        .where(ChatSession.id == session_id, ChatSession.user_id == str(user.id))
+        .order_by(desc(ChatMessage.id))
+        .limit(limit + 1)
+    )).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+
+    messages = [row for row in rows if row.id is not None]
+    page = messages[:limit]
 
     def try_parse_json(value):
         if isinstance(value, str):
@@ -141,16 +433,18 @@ async def get_chat_history(session_id: str, db: Session = Depends(get_db), user:
     history = [
         {
             "id": msg.id,
+            "uuid": msg.uuid,
             "role": msg.role,
             "content": msg.content,
             "advice_points": try_parse_json(msg.advice_points),
             "followup_questions": try_parse_json(msg.followup_questions),
             "timestamp": msg.created_at,
         }
-        for msg in messages
+        for msg in list(reversed(page)) + ([] if cursor else CHAT_WRITER.pending(session_id))
     ]
 
     return {
         "session_id": session_id,
-        "messages": history
+        "messages": history,
+        "next_cursor": encode_cursor(page[-1].id) if len(messages) > limit else None,
     }
@@ -0,0 +1,165 @@
+import math
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+
+@dataclass
+class _Entry:
+    vector: array
+    fingerprint: str
+    document_uuids: Set[str]
+    answer: dict
+    generation_seconds: float
+    stored_at: float = field(default_factory=time.monotonic)
+
+
+def _unit(vector: List[float]) -> array:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return array("f", (x / norm for x in vector))
+
+
+class SemanticAnswerCache:
+    """
+    Caches LLM answers keyed by the question embedding and a fingerprint of the
+    retrieved chunk IDs. A lookup hits when the context fingerprint matches and the
+    cosine similarity between questions reaches the threshold.
+    Entries are served to every user, so callers only store answers that were
+    generated without conversation history.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 2000, ttl_seconds: float = 86400):
+        """
+        :param threshold: Minimum cosine similarity between questions for a hit.
+        :param max_entries: Least recently used answers beyond this are evicted.
+        :param ttl_seconds: Entries older than this are treated as misses. 0 disables the TTL.
+        """
+        self.threshold = float(threshold)
+        self.max_entries = int(max_entries)
+        self.ttl_seconds = float(ttl_seconds)
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._by_fingerprint: Dict[str, Set[int]] = {}
+        self._by_document: Dict[str, Set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+
+    def lookup(self, query_vector: List[float], fingerprint: str) -> Optional[dict]:
+        """
+        Return a stored answer for a similar question over the same context, or None.
+        """
+        query = _unit(query_vector)
+        now = time.monotonic()
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._by_fingerprint.get(fingerprint, ())):
+                entry = self._entries[entry_id]
+                if self.ttl_seconds and now - entry.stored_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    continue
+                score = sum(a * b for a, b in zip(query, entry.vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            entry = self._entries[best_id]
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            self.saved_seconds += entry.generation_seconds
+            return dict(entry.answer)
+
+    def store(
+        self,
+        query_vector: List[float],
+        fingerprint: str,
+        document_uuids: Iterable[str],
+        answer: dict,
+        generation_seconds: float,
+    ) -> None:
+        """
+        Remember an answer generated from the given context.
+        """
+        entry = _Entry(
+            vector=_unit(query_vector),
+            fingerprint=fingerprint,
+            document_uuids=set(document_uuids),
+            answer=dict(answer),
+            generation_seconds=generation_seconds,
+        )
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._by_fingerprint.setdefault(fingerprint, set()).add(entry_id)
+            for document_uuid in entry.document_uuids:
+                self._by_document.setdefault(document_uuid, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_document(self, document_uuid: str) -> int:
+        """
+        Drop every answer built on chunks of the given document. Returns how many were dropped.
+        """
+        with self._lock:
+            entry_ids = list(self._by_document.get(document_uuid, ()))
+            for entry_id in entry_ids:
+                self._remove(entry_id)
+            self.invalidations += len(entry_ids)
+            return len(entry_ids)
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        ids = self._by_fingerprint.get(entry.fingerprint)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._by_fingerprint[entry.fingerprint]
+        for document_uuid in entry.document_uuids:
+            ids = self._by_document.get(document_uuid)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._by_document[document_uuid]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_fingerprint.clear()
+            self._by_document.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "saved_seconds": round(self.saved_seconds, 3),
+            "avg_saved_seconds_per_hit": round(self.saved_seconds / self.hits, 3) if self.hits else 0.0,
+        }
+
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+
+ANSWER_CACHE = SemanticAnswerCache(
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+    max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000")),
+    ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "86400")),
+)
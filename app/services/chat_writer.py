@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.db.database import AsyncSessionLocal
+from app.models.chat import ChatMessage
+from app.utils.logger import logger
+from app.utils.metrics import stage
+
+
+def _is_transient(exc: Exception) -> bool:
+    """
+    Whether a failed write may succeed as it is later (connection lost, deadlock,
+    pool exhausted), as opposed to rows the database refuses.
+    """
+    if isinstance(exc, DBAPIError) and exc.connection_invalidated:
+        return True
+    return isinstance(exc, (OperationalError, InterfaceError, PoolTimeoutError, OSError, asyncio.TimeoutError))
+
+
+class ChatMessageWriter:
+    """
+    Write-behind persistence of chat messages.
+    Messages get their uuid and created_at in memory, so a response never waits
+    for the database. A single background task inserts everything queued within
+    `max_wait_ms` in one transaction, in queue order, retrying failed batches
+    before newer ones. Until written, a session's messages are available from
+    `pending` so its history stays complete.
+
+    Only transient errors are retried. A batch the database refuses is written
+    again group by group and then row by row, so only the offending rows are
+    dropped. Before a retry, rows a failed commit did write are looked up by uuid.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        max_batch_size: int = 200,
+        max_wait_ms: float = 50,
+        max_attempts: int = 5,
+    ):
+        """
+        :param session_factory: Returns a new AsyncSession, e.g. AsyncSessionLocal.
+        :param max_batch_size: Most messages inserted per transaction.
+        :param max_wait_ms: How long the first queued message waits for company.
+        :param max_attempts: Attempts per write on transient errors before its rows are logged and dropped.
+        """
+        self.session_factory = session_factory
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.max_attempts = max(1, int(max_attempts))
+        # Groups of messages passed to one `enqueue` call, oldest first
+        self._queue: List[List[ChatMessage]] = []
+        self._by_session: Dict[str, List[ChatMessage]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[str], None]] = []
+
+        # Counters
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+    @staticmethod
+    def new_message(
+        session_id: str,
+        role: str,
+        content: str,
+        advice_points: Optional[list] = None,
+        followup_questions: Optional[list] = None,
+    ) -> ChatMessage:
+        """
+        Build a message with its uuid and timestamp set; `id` stays None until it is written.
+        """
+        return ChatMessage(
+            uuid=str(uuid.uuid4()),
+            session_id=session_id,
+            role=role,
+            content=content,
+            advice_points=json.dumps(advice_points) if advice_points else None,
+            followup_questions=json.dumps(followup_questions) if followup_questions else None,
+            created_at=datetime.utcnow(),
+        )
+
+    def add_flush_listener(self, listener: Callable[[str], None]) -> None:
+        """
+        Call `listener(session_id)` for each session whose messages were just written.
+        """
+        self._listeners.append(listener)
+
+    def enqueue(self, *messages: ChatMessage) -> None:
+        """
+        Queue messages for writing. Messages passed together are written in the same transaction.
+        """
+        if not messages:
+            return
+        self._queue.append(list(messages))
+        for message in messages:
+            self._by_session.setdefault(message.session_id, []).append(message)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    def pending(self, session_id: str) -> List[ChatMessage]:
+        """
+        Queued messages of the session not written yet, oldest first.
+        """
+        return list(self._by_session.get(session_id, ()))
+
+    async def _drain(self):
+        await asyncio.sleep(self.max_wait)
+        while self._queue:
+            # Whole groups only, so messages queued together are written together
+            groups, batch = [], []
+            for group in self._queue:
+                if batch and len(batch) + len(group) > self.max_batch_size:
+                    break
+                batch.extend(group)
+                groups.append(group)
+            await self._persist(batch, groups)
+            self._forget(len(groups), batch)
+
+    async def _persist(self, messages: List[ChatMessage], parts: List[List[ChatMessage]]):
+        """
+        Write `messages` in one transaction. If the database refuses it, write each
+        of `parts` on its own instead, down to single rows.
+        """
+        try:
+            await self._write_with_retry(messages)
+        except Exception as exc:
+            if len(messages) > 1 and not _is_transient(exc):
+                # A row the database refuses must not take the rest of the batch with it
+                for part in parts if len(parts) > 1 else [[message] for message in messages]:
+                    await self._persist(part, [part])
+                return
+            # A uuid conflict on retry means an earlier attempt did write the row
+            lost = await self._unwritten(messages)
+            if lost:
+                logger.error(f"Dropping {len(lost)} chat messages: {exc}")
+            self.written += len(messages) - len(lost)
+            self.dropped += len(lost)
+        else:
+            self.written += len(messages)
+
+    async def _write_with_retry(self, messages: List[ChatMessage]):
+        attempts = 0
+        while messages:
+            try:
+                await self._write(messages)
+                self.batches += 1
+                return
+            except Exception as exc:
+                attempts += 1
+                if not _is_transient(exc) or attempts >= self.max_attempts:
+                    raise
+                logger.warning(f"Writing {len(messages)} chat messages failed (attempt {attempts}): {exc}")
+                await asyncio.sleep(min(0.5 * 2 ** attempts, 10))
+                # The commit may have gone through before the connection was lost
+                messages = await self._unwritten(messages)
+
+    async def _write(self, batch: List[ChatMessage]):
+        with stage("chat_write", upstream="mysql"):
+            async with self.session_factory() as db:
+                db.add_all(batch)
+                await db.commit()
+
+    async def _unwritten(self, messages: List[ChatMessage]) -> List[ChatMessage]:
+        """
+        The messages whose uuid is not stored yet; all of them when that cannot be checked.
+        """
+        try:
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    select(ChatMessage.uuid).where(ChatMessage.uuid.in_([message.uuid for message in messages]))
+                )
+                stored = set(result.scalars())
+        except Exception:
+            return messages
+        return [message for message in messages if message.uuid not in stored]
+
+    def _forget(self, groups: int, batch: List[ChatMessage]):
+        del self._queue[:groups]
+        sessions = []
+        for message in batch:
+            queued = self._by_session.get(message.session_id)
+            if queued and message in queued:
+                queued.remove(message)
+                if not queued:
+                    del self._by_session[message.session_id]
+            if message.session_id not in sessions:
+                sessions.append(message.session_id)
+        for session_id in sessions:
+            for listener in self._listeners:
+                try:
+                    listener(session_id)
+                except Exception as exc:
+                    logger.warning(f"Chat flush listener failed for session {session_id}: {exc}")
+
+    async def aclose(self) -> None:
+        """
+        Write everything still queued, e.g. from the application lifespan.
+        """
+        if self._task is not None and not self._task.done():
+            await self._task
+        if self._queue:
+            await self._drain()
+
+    def stats(self) -> dict:
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "pending": sum(len(group) for group in self._queue),
+        }
+
+
+CHAT_WRITER = ChatMessageWriter(
+    AsyncSessionLocal,
+    max_batch_size=int(os.getenv("CHAT_WRITE_BATCH_SIZE", "200")),
+    max_wait_ms=float(os.getenv("CHAT_WRITE_WAIT_MS", "50")),
+)
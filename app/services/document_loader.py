@@ -1,18 +1,93 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 from langchain_community.document_loaders import PyMuPDFLoader, TextLoader
+from langchain_core.documents import Document
+
+from app.services.pdf_page_worker import extract_page_texts
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    """
+    Return the process-wide PDF extraction pool, (re)creating it for the requested size.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn: forking a process that runs ingestion threads can deadlock
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
 
 class DocumentLoader:
     """
     Loads and parses documents from a file path.
     """
 
+    def __init__(self, workers=None, pages_per_task=None):
+        """
+        :param workers: Processes used to extract PDF text. 0 or 1 parses on the calling thread.
+        :param pages_per_task: Pages extracted by one worker task.
+        """
+        self.workers = int(workers if workers is not None else os.getenv("PDF_LOADER_WORKERS", "0"))
+        self.pages_per_task = int(pages_per_task or os.getenv("PDF_LOADER_PAGES_PER_TASK", "32"))
+
     def load(self, file_path):
         """
         Load documents from the given file path.
         """
 
         if file_path.endswith('.pdf'):
+            if self.workers > 1:
+                return self._parallel_pdf_load(file_path)
             loader = PyMuPDFLoader(file_path)
         else:
             loader = TextLoader(file_path)
 
         return loader.lazy_load()
+
+    def _parallel_pdf_load(self, file_path):
+        """
+        Extract page ranges in a process pool and yield one Document per page, in page order.
+        The same Documents and metadata as PyMuPDFLoader are produced.
+        """
+        # The stock loader parses page 0, which also gives us the exact metadata layout
+        pages = PyMuPDFLoader(file_path).lazy_load()
+        first = next(pages, None)
+        pages.close()
+        if first is None:
+            return
+        yield first
+
+        total_pages = int(first.metadata.get("total_pages", 1))
+        base_metadata = {key: value for key, value in first.metadata.items() if key != "page"}
+        ranges = deque(
+            (start, min(start + self.pages_per_task, total_pages))
+            for start in range(1, total_pages, self.pages_per_task)
+        )
+
+        # Keep a bounded number of ranges in flight so memory stays flat
+        pool = _get_pool(self.workers)
+        in_flight = deque()
+        try:
+            while ranges or in_flight:
+                while ranges and len(in_flight) < self.workers * 2:
+                    start, stop = ranges.popleft()
+                    in_flight.append((start, pool.submit(extract_page_texts, file_path, start, stop)))
+
+                start, future = in_flight.popleft()
+                for offset, text in enumerate(future.result()):
+                    yield Document(page_content=text, metadata={**base_metadata, "page": start + offset})
+        finally:
+            for _, future in in_flight:
+                future.cancel()
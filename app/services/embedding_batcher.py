@@ -0,0 +1,93 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from app.utils.logger import logger
+
+
+class EmbeddingBatcher:
+    """
+    Collects concurrent query embeddings for a few milliseconds and sends them
+    to the embeddings API as one call. Identical texts in a batch are embedded once.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_batch_size: int = 10,
+        max_wait_ms: float = 5.0,
+    ):
+        """
+        :param embed_fn: Async callable embedding a list of texts in one API call.
+        :param max_batch_size: Flush as soon as this many texts are pending.
+        :param max_wait_ms: Longest time the first pending text waits for company.
+        """
+        self.embed_fn = embed_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # Running batches; the loop only keeps weak references to tasks
+        self._tasks: Set[asyncio.Task] = set()
+
+        # Counters
+        self.requests = 0
+        self.api_calls = 0
+
+    async def embed(self, text: str) -> List[float]:
+        """
+        Queue one text and wait for its vector.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self.requests += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        while self._pending:
+            batch = self._pending[: self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size :]
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Embedding batch failed unexpectedly: {task.exception()}")
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self.api_calls += 1
+        try:
+            vectors = await self.embed_fn(texts)
+            if len(vectors) != len(texts):
+                raise RuntimeError("Embedding API returned unexpected response")
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        by_text = dict(zip(texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "api_calls": self.api_calls,
+            "pending": len(self._pending),
+            "in_flight": len(self._tasks),
+        }
@@ -0,0 +1,106 @@
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+
+def normalize_query(text: str) -> str:
+    """
+    Collapse whitespace and lowercase, so trivially different spellings share an entry.
+    """
+    return " ".join(text.split()).lower()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded in-process LRU cache for query embeddings with a TTL.
+    Vectors are stored as float32 arrays (4 bytes per dimension) instead of Python floats.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 3600):
+        """
+        :param max_entries: Maximum number of cached queries.
+        :param max_bytes: Approximate memory cap for keys and vectors.
+        :param ttl_seconds: Entries older than this are treated as misses. 0 disables the TTL.
+        """
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self.ttl_seconds = float(ttl_seconds)
+        self._entries: "OrderedDict[str, Tuple[float, array]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _entry_size(key: str, vector: array) -> int:
+        return len(key) + vector.itemsize * len(vector)
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """
+        Return the cached vector for the query, or None.
+        """
+        key = normalize_query(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, vector = entry
+            if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector.tolist()
+
+    def put(self, text: str, vector: List[float]) -> None:
+        """
+        Store a vector, evicting least recently used entries past the caps.
+        """
+        key = normalize_query(text)
+        compact = array("f", vector)
+        size = self._entry_size(key, compact)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), compact)
+            self._bytes += size
+
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, vector = self._entries.pop(key)
+        self._bytes -= self._entry_size(key, vector)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
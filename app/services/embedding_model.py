@@ -1,11 +1,18 @@
+import asyncio
 import os
+import threading
 import time
 from typing import List
 
 from langchain_core.embeddings import Embeddings
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from langchain_openai.embeddings import OpenAIEmbeddings
 
+from app.config import LLM_BASE_URL
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import QueryEmbeddingCache
+from app.services.embedding_store import EmbeddingStore
+
 class EmbeddingModel(Embeddings):
     """
     Wrapper around DashScope embeddings that:
@@ -17,8 +24,9 @@ class EmbeddingModel(Embeddings):
     def __init__(self, model_name: str = "text-embedding-v3", batch_size: int = 10):
         self.model_name = model_name
         self.api_key = os.getenv("OPENAI_API_KEY")
-        self.base_url = "https://dashscope-intl.aliyuncs.com/compatible-mode/v1"
+        self.base_url = os.getenv("EMBEDDING_BASE_URL", LLM_BASE_URL)
         self.batch_size = int(batch_size)
+        self.batch_wait_ms = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
 
         self.model = OpenAIEmbeddings(
             model=model_name,
@@ -28,6 +36,48 @@ class EmbeddingModel(Embeddings):
 
         # Direct OpenAI client (for stable embedding calls)
         self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        # Async client for the request path, so embedding never blocks the event loop
+        self.async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+
+        # Micro-batcher for concurrent query embeddings (bound to one event loop)
+        self._batcher = None
+        self._batcher_loop = None
+
+        # Repeated questions and follow-up buttons skip the API entirely
+        self.query_cache = QueryEmbeddingCache(
+            max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000")),
+            max_bytes=int(float(os.getenv("EMBEDDING_CACHE_MAX_MB", "64")) * 1024 * 1024),
+            ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL", "3600")),
+        )
+
+        # On-disk chunk embedding cache for ingestion, opened on first use.
+        # Set EMBEDDING_STORE_PATH to an empty string to disable it.
+        self.store_path = os.getenv("EMBEDDING_STORE_PATH", "storage/embeddings/embeddings.sqlite3")
+        self.store_max_rows = int(os.getenv("EMBEDDING_STORE_MAX_ROWS", "250000"))
+        self._document_store = None
+        self._document_store_lock = threading.Lock()
+
+    @property
+    def document_store(self):
+        """
+        Return the persistent embedding store, or None when disabled.
+        """
+        if self._document_store is None and self.store_path:
+            # Ingest threads ask concurrently; open a single connection
+            with self._document_store_lock:
+                if self._document_store is None:
+                    self._document_store = EmbeddingStore(self.store_path, max_rows=self.store_max_rows)
+        return self._document_store
+
+    def close_document_store(self):
+        """
+        Close the persistent embedding store's connection, e.g. from the application lifespan.
+        A later ingest opens it again.
+        """
+        with self._document_store_lock:
+            store, self._document_store = self._document_store, None
+        if store is not None:
+            store.close()
 
     def get(self):
         """
@@ -51,6 +101,7 @@ class EmbeddingModel(Embeddings):
     def embed_documents(self, docs: List[str]) -> List[List[float]]:
         """
         Safely embed a list of docs by batching requests to <= self.batch_size.
+        Chunks already in the persistent store are not sent to the API.
         Returns embeddings in the same order as docs.
         """
         if not docs:
@@ -62,6 +113,24 @@ class EmbeddingModel(Embeddings):
             dim = 1024 if "v3" in self.model_name or "embedding-v3" in self.model_name else 1536
             return [[0.0] * dim]
 
+        store = self.document_store
+        if store is None:
+            return self._embed_uncached(docs)
+
+        embeddings = store.get_many(self.model_name, docs)
+        missing = [i for i, vector in enumerate(embeddings) if vector is None]
+        if missing:
+            texts = [docs[i] for i in missing]
+            vectors = self._embed_uncached(texts)
+            store.put_many(self.model_name, texts, vectors)
+            for i, vector in zip(missing, vectors):
+                embeddings[i] = vector
+        return embeddings
+
+    def _embed_uncached(self, docs: List[str]) -> List[List[float]]:
+        """
+        Embed docs through the API in batches, retrying each batch.
+        """
         embeddings: List[List[float]] = []
         n = len(docs)
         for i in range(0, n, self.batch_size):
@@ -87,11 +156,116 @@ class EmbeddingModel(Embeddings):
 
         return embeddings
 
+    async def _acall_embedding_api(self, inputs: List[str]):
+        """
+        Async variant of `_call_embedding_api`.
+        """
+        response = await self.async_client.embeddings.create(
+            model=self.model_name,
+            input=inputs,
+            encoding_format="float"
+        )
+        return [item.embedding for item in response.data]
+
+    async def aembed_documents(self, docs: List[str]) -> List[List[float]]:
+        """
+        Async variant of `embed_documents` with the same batching, retries and store lookups.
+        """
+        if not docs:
+            return []
+
+        if docs == ["dummy_text"]:
+            return self.embed_documents(docs)
+
+        store = self.document_store
+        if store is None:
+            return await self._aembed_uncached(docs)
+
+        embeddings = await asyncio.to_thread(store.get_many, self.model_name, docs)
+        missing = [i for i, vector in enumerate(embeddings) if vector is None]
+        if missing:
+            texts = [docs[i] for i in missing]
+            vectors = await self._aembed_uncached(texts)
+            await asyncio.to_thread(store.put_many, self.model_name, texts, vectors)
+            for i, vector in zip(missing, vectors):
+                embeddings[i] = vector
+        return embeddings
+
+    async def _aembed_uncached(self, docs: List[str]) -> List[List[float]]:
+        embeddings: List[List[float]] = []
+        n = len(docs)
+        for i in range(0, n, self.batch_size):
+            batch = docs[i : i + self.batch_size]
+            attempt = 0
+            while True:
+                try:
+                    vecs = await self._acall_embedding_api(batch)
+                    if not isinstance(vecs, list) or len(vecs) < 1:
+                        raise RuntimeError("Embedding API returned unexpected response")
+                    embeddings.extend(vecs)
+                    break
+                except Exception as exc:
+                    attempt += 1
+                    if attempt >= 3:
+                        raise RuntimeError(
+                            f"Embedding API failed after {attempt} attempts for batch starting at index {i}"
+                        ) from exc
+                    await asyncio.sleep(0.5 * attempt)
+
+        return embeddings
+
+    def _get_batcher(self) -> EmbeddingBatcher:
+        loop = asyncio.get_running_loop()
+        if self._batcher is None or self._batcher_loop is not loop:
+            self._batcher = EmbeddingBatcher(
+                self._acall_embedding_api,
+                max_batch_size=self.batch_size,
+                max_wait_ms=self.batch_wait_ms,
+            )
+            self._batcher_loop = loop
+        return self._batcher
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Embed a single query without blocking the event loop.
+        Concurrent queries are micro-batched into one API call.
+        """
+        cached = self.query_cache.get(text)
+        if cached is not None:
+            return cached
+
+        vector = await self._get_batcher().embed(text)
+        self.query_cache.put(text, vector)
+        return vector
+
     def embed_query(self, text: str) -> list[float]:
         """Safe embedding for a single query string."""
+        cached = self.query_cache.get(text)
+        if cached is not None:
+            return cached
+
         response = self.client.embeddings.create(
             model=self.model_name,
             input=text,
             encoding_format="float"
         )
-        return response.data[0].embedding
\ No newline at end of file
+        vector = response.data[0].embedding
+        self.query_cache.put(text, vector)
+        return vector
+
+
+_shared_model = None
+_shared_lock = threading.Lock()
+
+
+def get_embedding_model() -> EmbeddingModel:
+    """
+    Process-wide embedding model, created on first use. Sharing it also shares the
+    query embedding cache and the API connection pools.
+    """
+    global _shared_model
+    if _shared_model is None:
+        with _shared_lock:
+            if _shared_model is None:
+                _shared_model = EmbeddingModel()
+    return _shared_model
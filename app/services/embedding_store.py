@@ -0,0 +1,147 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import List, Optional
+
+# SQLite's default limit on bound parameters per statement
+_SQL_CHUNK = 500
+
+
+class EmbeddingStore:
+    """
+    Persistent content-addressed embedding cache backed by SQLite.
+    Rows are keyed by sha256(model_name, text) and hold float32 vectors, so
+    re-ingesting a manual only sends new or changed chunks to the API.
+    """
+
+    def __init__(self, path: str, max_rows: int = 250000):
+        """
+        :param path: SQLite file, created with its directory if missing.
+        :param max_rows: Least recently used rows beyond this are evicted.
+        """
+        self.path = path
+        self.max_rows = int(max_rows)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_many(self, model_name: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Return cached vectors in the same order as texts, None for misses.
+        """
+        keys = [self.key(model_name, text) for text in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _SQL_CHUNK):
+                chunk = keys[i : i + _SQL_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+
+        results: List[Optional[List[float]]] = []
+        for key in keys:
+            blob = found.get(key)
+            if blob is None:
+                self.misses += 1
+                results.append(None)
+            else:
+                self.hits += 1
+                vector = array("f")
+                vector.frombytes(blob)
+                results.append(vector.tolist())
+        return results
+
+    def put_many(self, model_name: str, texts: List[str], vectors: List[List[float]]) -> None:
+        """
+        Store vectors for texts and evict the least recently used rows past max_rows.
+        """
+        if not texts:
+            return
+
+        now = time.time()
+        rows = [
+            (self.key(model_name, text), len(vector), array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            # Callers pass misses, so normally every row is new; the row count is
+            # kept from the change counts instead of a COUNT(*) per write
+            changes = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            inserted = self._conn.total_changes - changes
+            if inserted < len(rows):
+                # Stored meanwhile (e.g. by a concurrent job): refresh those rows
+                self._conn.executemany(
+                    "UPDATE embeddings SET dim = ?, vector = ?, last_used = ? WHERE key = ?",
+                    [(dim, blob, used, key) for key, dim, blob, used in rows],
+                )
+            self._rows += inserted
+
+            overflow = self._rows - self.max_rows
+            if overflow > 0:
+                evicted = self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                ).rowcount
+                self._rows -= evicted
+                self.evictions += evicted
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "rows": self._rows,
+            "max_rows": self.max_rows,
+            "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
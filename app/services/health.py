@@ -0,0 +1,91 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import text
+
+from app.config import HEALTH_CHECK_TIMEOUT, HEALTH_CHECK_TTL
+from app.db.database import AsyncSessionLocal
+from app.langchain.qa_chain import CHAIN_REGISTRY
+from app.services.qdrant_connection import get_async_qdrant_client
+
+
+class HealthCheck:
+    """
+    Cached, rate-limited check of one dependency.
+    The probe runs at most once per `ttl` whatever the polling rate; concurrent
+    callers share the running probe, and its result (good or bad) is reused until it expires.
+    """
+
+    def __init__(self, name: str, probe: Callable[[], Awaitable[None]], ttl: float = 10, timeout: float = 2):
+        """
+        :param name: Dependency name in the readiness report.
+        :param probe: Coroutine function raising when the dependency is unusable.
+        :param ttl: Seconds a result is reused.
+        :param timeout: Seconds before the probe counts as failed.
+        """
+        self.name = name
+        self.probe = probe
+        self.ttl = float(ttl)
+        self.timeout = float(timeout)
+        self._result: Optional[dict] = None
+        self._checked_at = 0.0
+        self._running: Optional[asyncio.Future] = None
+
+    async def check(self) -> dict:
+        if self._result is not None and time.monotonic() - self._checked_at < self.ttl:
+            return self._result
+        if self._running is None:
+            self._running = asyncio.ensure_future(self._run())
+        # A caller that goes away does not cancel the probe for the others
+        return await asyncio.shield(self._running)
+
+    async def _run(self) -> dict:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.probe(), self.timeout)
+            result = {"ok": True}
+        except asyncio.TimeoutError:
+            result = {"ok": False, "error": f"timed out after {self.timeout:g}s"}
+        except Exception as exc:
+            result = {"ok": False, "error": str(exc) or type(exc).__name__}
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self._result, self._checked_at, self._running = result, time.monotonic(), None
+        return result
+
+
+class ReadinessProbe:
+    """
+    Runs every dependency check concurrently; ready when all of them pass.
+    """
+
+    def __init__(self, *checks: HealthCheck):
+        self.checks = checks
+
+    async def check(self) -> Dict:
+        results = await asyncio.gather(*(check.check() for check in self.checks))
+        report = {check.name: result for check, result in zip(self.checks, results)}
+        return {"ready": all(result["ok"] for result in results), "checks": report}
+
+
+async def _mysql():
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("SELECT 1"))
+
+
+async def _qdrant():
+    await get_async_qdrant_client().get_collections()
+
+
+async def _llm():
+    # Any answer below 500 (even 401/404) means the endpoint is up and reachable
+    status_code = await CHAIN_REGISTRY.ping(timeout=HEALTH_CHECK_TIMEOUT)
+    if status_code >= 500:
+        raise RuntimeError(f"HTTP {status_code}")
+
+
+READINESS = ReadinessProbe(
+    HealthCheck("mysql", _mysql, ttl=HEALTH_CHECK_TTL, timeout=HEALTH_CHECK_TIMEOUT),
+    HealthCheck("qdrant", _qdrant, ttl=HEALTH_CHECK_TTL, timeout=HEALTH_CHECK_TIMEOUT),
+    HealthCheck("llm", _llm, ttl=HEALTH_CHECK_TTL, timeout=HEALTH_CHECK_TIMEOUT),
+)
@@ -0,0 +1,260 @@
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app.services.uploads import discard_file
+from app.utils.logger import logger
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_STATUSES = (JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+
+class JobQueueFullError(Exception):
+    """
+    Raised when the ingestion queue already holds the maximum number of pending jobs.
+    """
+
+
+class JobStateError(Exception):
+    """
+    Raised when a job cannot be cancelled or retried in its current state.
+    """
+
+
+class DocumentBusyError(Exception):
+    """
+    Raised when a document already has a queued or running job.
+    Two runs for one document would delete each other's points as stale.
+    """
+
+    def __init__(self, job: "IngestJob"):
+        super().__init__(f"Manual {job.document_uuid} is already being ingested by job {job.id}")
+        self.job = job
+
+
+@dataclass
+class IngestJob:
+    """
+    One manual ingestion and its progress.
+    """
+    document_uuid: str
+    file_path: str
+    content_sha256: Optional[str] = None
+    # Manual fields stamped on every chunk, see SCOPE_FIELDS
+    scope: Dict[str, Any] = field(default_factory=dict)
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    status: JobStatus = JobStatus.QUEUED
+    attempts: int = 0
+    pages_parsed: int = 0
+    chunks_embedded: int = 0
+    points_upserted: int = 0
+    chunks_unchanged: int = 0
+    points_deleted: int = 0
+    total_batches: int = 0
+    failed_batches: List[int] = field(default_factory=list)
+    # Batches already upserted; a retry skips them
+    done_batches: Set[int] = field(default_factory=set)
+    # Point IDs of every chunk seen in the current attempt
+    point_ids: Set[str] = field(default_factory=set, repr=False)
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "uuid": self.document_uuid,
+            "content_sha256": self.content_sha256,
+            "scope": dict(self.scope),
+            "status": self.status.value,
+            "attempts": self.attempts,
+            "pages_parsed": self.pages_parsed,
+            "chunks_embedded": self.chunks_embedded,
+            "points_upserted": self.points_upserted,
+            "chunks_unchanged": self.chunks_unchanged,
+            "points_deleted": self.points_deleted,
+            "total_batches": self.total_batches,
+            "completed_batches": len(self.done_batches),
+            "failed_batches": list(self.failed_batches),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestJobManager:
+    """
+    Runs ingestion jobs on a bounded worker pool, off the API event loop.
+    Job state lives in this process, so status must be queried on the same worker.
+    The job's upload is deleted once it succeeds or is cancelled; a failed job keeps
+    it for a retry until the job drops out of the finished-job history.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[IngestJob], None],
+        max_workers: int = 2,
+        max_pending: int = 20,
+        max_finished: int = 200,
+    ):
+        """
+        :param runner: Runs one job attempt, updating its progress counters. Raising marks the job failed.
+        :param max_workers: Jobs processed at the same time.
+        :param max_pending: Queued or running jobs accepted before submissions are refused.
+        :param max_finished: Finished jobs kept for status lookups.
+        """
+        self.runner = runner
+        self.max_pending = int(max_pending)
+        self.max_finished = int(max_finished)
+        self._executor = ThreadPoolExecutor(max_workers=int(max_workers), thread_name_prefix="ingest")
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        document_uuid: str,
+        file_path: str,
+        content_sha256: Optional[str] = None,
+        scope: Optional[Dict[str, Any]] = None,
+    ) -> IngestJob:
+        """
+        Queue a new ingestion job and return it immediately.
+        Raises DocumentBusyError while another job for the document is queued or running.
+        """
+        job = IngestJob(
+            document_uuid=document_uuid,
+            file_path=file_path,
+            content_sha256=content_sha256,
+            scope=dict(scope or {}),
+        )
+        with self._lock:
+            self._raise_if_busy(document_uuid)
+            self._reserve_slot()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(job_id)
+
+    def find_active(self, document_uuid: str) -> Optional[IngestJob]:
+        """
+        Return the queued or running job for the document, if any.
+        """
+        for job in list(self._jobs.values()):
+            if job.document_uuid == document_uuid and job.status not in FINISHED_STATUSES:
+                return job
+        return None
+
+    def cancel(self, job_id: str) -> IngestJob:
+        """
+        Ask a queued or running job to stop after its current batch.
+        """
+        job = self._get_or_raise(job_id)
+        if job.status in FINISHED_STATUSES:
+            raise JobStateError(f"Job is already {job.status.value}")
+        job.cancel_event.set()
+        return job
+
+    def retry(self, job_id: str) -> IngestJob:
+        """
+        Re-queue a failed job. Batches that already succeeded are skipped.
+        """
+        job = self._get_or_raise(job_id)
+        if job.status != JobStatus.FAILED:
+            raise JobStateError(f"Only failed jobs can be retried, job is {job.status.value}")
+        with self._lock:
+            self._raise_if_busy(job.document_uuid)
+            self._reserve_slot(keep=job.id)
+            job.status = JobStatus.QUEUED
+            job.error = None
+            job.finished_at = None
+        self._executor.submit(self._run, job)
+        return job
+
+    def shutdown(self) -> None:
+        """
+        Cancel outstanding jobs and stop the worker pool.
+        """
+        for job in list(self._jobs.values()):
+            if job.status not in FINISHED_STATUSES:
+                job.cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_or_raise(self, job_id: str) -> IngestJob:
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        return job
+
+    def _raise_if_busy(self, document_uuid: str) -> None:
+        # Called with the lock held, so the check and the insert are one step
+        active = self.find_active(document_uuid)
+        if active is not None:
+            raise DocumentBusyError(active)
+
+    def _reserve_slot(self, keep: Optional[str] = None) -> None:
+        # Called with the lock held
+        active = sum(1 for job in self._jobs.values() if job.status not in FINISHED_STATUSES)
+        if active >= self.max_pending:
+            raise JobQueueFullError("Ingestion queue is full")
+
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in FINISHED_STATUSES and job_id != keep
+        ]
+        for job_id in finished[: max(0, len(finished) - self.max_finished + 1)]:
+            discard_file(self._jobs.pop(job_id).file_path)
+
+    def _run(self, job: IngestJob) -> None:
+        if job.cancelled:
+            job.status = JobStatus.CANCELLED
+            job.finished_at = datetime.now(timezone.utc)
+            discard_file(job.file_path)
+            return
+
+        job.status = JobStatus.RUNNING
+        job.attempts += 1
+        job.started_at = datetime.now(timezone.utc)
+        try:
+            self.runner(job)
+            if job.cancelled:
+                job.status = JobStatus.CANCELLED
+            elif job.failed_batches:
+                job.status = JobStatus.FAILED
+                job.error = f"{len(job.failed_batches)} batch(es) failed"
+            else:
+                job.status = JobStatus.SUCCEEDED
+        except Exception as exc:
+            logger.exception(f"Ingestion job {job.id} failed: {exc}")
+            job.status = JobStatus.FAILED
+            job.error = str(exc)
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            if job.status != JobStatus.FAILED:
+                discard_file(job.file_path)
+            logger.info(
+                f"Ingestion job {job.id} for {job.document_uuid} {job.status.value}: "
+                f"{job.pages_parsed} pages, {job.chunks_embedded} chunks embedded, "
+                f"{job.points_upserted} points upserted"
+            )
@@ -0,0 +1,283 @@
+import queue
+import threading
+import time
+
+from app.services.document_loader import DocumentLoader
+from app.services.embedding_model import get_embedding_model
+from app.services.ingest_jobs import IngestJob
+from app.services.qdrant_vectordb import QdrantVectorDB, get_vector_db, point_id
+from app.services.text_splitter import TextSplitter
+from app.utils.logger import logger
+
+# Marks the end of a stage's input
+_DONE = object()
+# How often a stage blocked on a queue checks whether the others are still running
+_POLL_SECONDS = 0.5
+
+
+class IngestPipeline:
+    """
+    Streaming load → split → embed → upsert for one ingestion job.
+    Parsing, embedding and upserting run at the same time on their own threads,
+    connected by bounded queues, so peak memory stays flat for any document size.
+
+    Point IDs are derived from (document_uuid, chunk content), so a re-ingest only
+    embeds and upserts new or changed chunks and then deletes the stale ones.
+    The document is marked as ingested from its file hash only once a run has
+    finished without failed batches; a run clears the mark before writing anything.
+    """
+
+    def __init__(
+        self,
+        collection_name,
+        embedding_model=None,
+        batch_size=64,
+        queue_depth=4,
+        max_batch_attempts=3,
+        on_complete=None,
+    ):
+        """
+        :param collection_name: Qdrant collection to upsert into.
+        :param embedding_model: EmbeddingModel used for chunk embeddings; the shared one when None.
+        :param batch_size: Chunks embedded and upserted per batch.
+        :param queue_depth: Batches buffered between two stages before the upstream stage waits.
+        :param max_batch_attempts: Attempts per batch and stage before it is recorded as failed.
+        :param on_complete: Optional callable(job) run after every attempt, e.g. cache invalidation.
+        """
+        self._embedding_model = embedding_model
+        self._shared_store = embedding_model is None
+        self._vector_db = None
+        self.collection_name = collection_name
+        self.batch_size = int(batch_size)
+        self.queue_depth = int(queue_depth)
+        self.max_batch_attempts = int(max_batch_attempts)
+        self.on_complete = on_complete
+
+    @property
+    def embedding_model(self):
+        # Resolved on the first job, not when the pipeline is built at import time
+        if self._embedding_model is None:
+            self._embedding_model = get_embedding_model()
+        return self._embedding_model
+
+    @property
+    def vector_db(self):
+        # One store for every job: the process-wide one, or this pipeline's own with its own embedding model
+        if self._vector_db is None:
+            if self._shared_store:
+                self._vector_db = get_vector_db(self.collection_name)
+            else:
+                self._vector_db = QdrantVectorDB(collection_name=self.collection_name, embeddings=self.embedding_model)
+        return self._vector_db
+
+    def __call__(self, job: IngestJob):
+        try:
+            self.run(job)
+        finally:
+            if self.on_complete is not None:
+                self.on_complete(job)
+
+    def run(self, job: IngestJob):
+        vector_db = self.vector_db
+
+        # The document is a mix of revisions until this run completes
+        vector_db.mark_document_ingested(job.document_uuid, None)
+
+        # Progress of this attempt; batches a retry skips are only in done_batches
+        job.pages_parsed = 0
+        job.chunks_embedded = 0
+        job.chunks_unchanged = 0
+        job.points_upserted = 0
+        job.points_deleted = 0
+        job.failed_batches = []
+        job.point_ids = set()
+        embed_queue = queue.Queue(maxsize=self.queue_depth)
+        upsert_queue = queue.Queue(maxsize=self.queue_depth)
+        # Set by every stage thread on exit, so the others stop waiting on a queue nobody reads
+        stop = threading.Event()
+        errors = []
+        stages = [
+            threading.Thread(
+                target=self._run_stage,
+                args=(job, stop, errors, self._embed_stage, vector_db, embed_queue, upsert_queue, stop),
+                name=f"ingest-embed-{job.id[:8]}",
+            ),
+            threading.Thread(
+                target=self._run_stage,
+                args=(job, stop, errors, self._upsert_stage, vector_db, upsert_queue, stop),
+                name=f"ingest-upsert-{job.id[:8]}",
+            ),
+        ]
+        for stage in stages:
+            stage.start()
+
+        try:
+            self._parse_stage(job, embed_queue, stop)
+        finally:
+            self._put(embed_queue, _DONE, stop)
+            for stage in stages:
+                stage.join()
+
+        if errors:
+            raise RuntimeError(f"Ingestion stage failed: {errors[0]}") from errors[0]
+
+        # Only a complete run knows every chunk of the new revision
+        if not job.cancelled and not job.failed_batches:
+            before = vector_db.count_document_points(job.document_uuid)
+            vector_db.delete_stale_points(job.document_uuid, job.point_ids)
+            job.points_deleted = max(0, before - len(job.point_ids))
+            if job.content_sha256:
+                vector_db.mark_document_ingested(job.document_uuid, job.content_sha256)
+
+    def _pages(self, job: IngestJob):
+        for page in DocumentLoader().load(job.file_path):
+            job.pages_parsed += 1
+            yield page
+
+    @staticmethod
+    def _run_stage(job: IngestJob, stop: threading.Event, errors: list, stage, *args):
+        try:
+            stage(job, *args)
+        except Exception as exc:
+            logger.exception(f"Ingestion job {job.id} {stage.__name__} stopped: {exc}")
+            errors.append(exc)
+        finally:
+            stop.set()
+
+    @staticmethod
+    def _put(target: queue.Queue, item, stop: threading.Event) -> bool:
+        """
+        Put on a bounded queue, giving up once a stage has exited and nothing may drain it.
+        """
+        while True:
+            try:
+                target.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                if stop.is_set():
+                    return False
+
+    @staticmethod
+    def _get(source: queue.Queue, stop: threading.Event):
+        """
+        Take from a queue; _DONE once it is empty and a stage has exited, so a dead
+        upstream stage cannot leave its consumer waiting.
+        """
+        while True:
+            try:
+                return source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                if stop.is_set():
+                    return _DONE
+
+    def _parse_stage(self, job: IngestJob, embed_queue: queue.Queue, stop: threading.Event):
+        """
+        Load pages lazily, split them incrementally and hand out fixed-size batches.
+        """
+        splitter = TextSplitter()
+        batch, index = [], 0
+        for chunk in splitter.iter_split(self._pages(job)):
+            if job.cancelled or stop.is_set():
+                return
+            chunk_id = point_id(job.document_uuid, chunk.page_content)
+            if chunk_id in job.point_ids:
+                # Identical text repeated in the document maps to one point
+                continue
+            job.point_ids.add(chunk_id)
+            chunk.metadata.update(self._payload_stamp(job))
+            batch.append((chunk_id, chunk))
+            if len(batch) >= self.batch_size:
+                if index not in job.done_batches and not self._put(embed_queue, (index, batch), stop):
+                    return
+                batch, index = [], index + 1
+
+        if batch and not job.cancelled:
+            if index not in job.done_batches and not self._put(embed_queue, (index, batch), stop):
+                return
+            index += 1
+        job.total_batches = index
+
+    def _embed_stage(
+        self, job: IngestJob, vector_db, embed_queue: queue.Queue, upsert_queue: queue.Queue, stop: threading.Event
+    ):
+        try:
+            while True:
+                item = self._get(embed_queue, stop)
+                if item is _DONE or stop.is_set():
+                    return
+                index, batch = item
+                if job.cancelled:
+                    continue
+
+                # Chunks whose point already exists are unchanged since the last ingest
+                existing = self._with_retries(
+                    job, index, "lookup",
+                    lambda: vector_db.existing_point_ids([chunk_id for chunk_id, _ in batch]),
+                )
+                if existing is None:
+                    continue
+                stamp = self._payload_stamp(job)
+                if existing and stamp:
+                    updated = self._with_retries(
+                        job, index, "set_payload",
+                        lambda: vector_db.set_metadata(existing, stamp),
+                    )
+                    if updated is None:
+                        continue
+                job.chunks_unchanged += len(existing)
+                batch = [chunk for chunk_id, chunk in batch if chunk_id not in existing]
+                if not batch:
+                    job.done_batches.add(index)
+                    continue
+
+                vectors = self._with_retries(
+                    job, index, "embed",
+                    lambda: self.embedding_model.embed_documents([doc.page_content for doc in batch]),
+                )
+                if vectors is not None:
+                    job.chunks_embedded += len(batch)
+                    if not self._put(upsert_queue, (index, batch, vectors), stop):
+                        return
+        finally:
+            self._put(upsert_queue, _DONE, stop)
+
+    def _upsert_stage(self, job: IngestJob, vector_db, upsert_queue: queue.Queue, stop: threading.Event):
+        while True:
+            item = self._get(upsert_queue, stop)
+            if item is _DONE:
+                return
+            index, batch, vectors = item
+            if job.cancelled:
+                continue
+            point_ids = self._with_retries(
+                job, index, "upsert",
+                lambda: vector_db.add_embedded_documents(batch, vectors, document_uuid=job.document_uuid),
+            )
+            if point_ids is not None:
+                job.points_upserted += len(batch)
+                job.done_batches.add(index)
+
+    @staticmethod
+    def _payload_stamp(job: IngestJob) -> dict:
+        """
+        Metadata written on every chunk of the job, including unchanged ones.
+        """
+        stamp = dict(job.scope)
+        if job.content_sha256:
+            stamp["content_sha256"] = job.content_sha256
+        return stamp
+
+    def _with_retries(self, job: IngestJob, index, stage, func):
+        """
+        Run one stage of one batch with retries. Failed batches are recorded on the job.
+        """
+        for attempt in range(1, self.max_batch_attempts + 1):
+            try:
+                return func()
+            except Exception as exc:
+                logger.warning(f"Ingestion job {job.id} batch {index} {stage} attempt {attempt} failed: {exc}")
+                if attempt < self.max_batch_attempts and not job.cancelled:
+                    time.sleep(attempt)
+
+        job.failed_batches.append(index)
+        return None
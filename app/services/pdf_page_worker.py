@@ -0,0 +1,10 @@
+import pymupdf
+
+
+def extract_page_texts(file_path: str, start: int, stop: int) -> list[str]:
+    """
+    Extract the text of pages [start, stop) of a PDF, stripped like PyMuPDFLoader does.
+    Runs inside loader worker processes, so this module keeps its imports minimal.
+    """
+    with pymupdf.open(file_path) as pdf:
+        return [pdf[i].get_text().strip() for i in range(start, stop)]
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from app.utils.logger import logger
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfileCapture:
+    """
+    Samples and event-loop lag collected while one request runs.
+    The event loop is shared, so overlapping requests see each other's samples;
+    the thread name at the root of every stack tells loop, threadpool and ingest work apart.
+    """
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.route = None
+        self.status = None
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.stacks: StackCounter = StackCounter()
+        self.samples = 0
+        self.loop_blocked_seconds = 0.0
+        self.loop_max_lag_seconds = 0.0
+
+    def to_dict(self, duration: float, interval: float) -> dict:
+        leaves: StackCounter = StackCounter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return {
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(duration * 1000, 1),
+            "sample_interval_ms": round(interval * 1000, 2),
+            "samples": self.samples,
+            "loop_blocked_ms": round(self.loop_blocked_seconds * 1000, 1),
+            "loop_max_lag_ms": round(self.loop_max_lag_seconds * 1000, 1),
+            "top_functions": [
+                {"function": name, "samples": count} for name, count in leaves.most_common(25)
+            ],
+            # Folded "thread;outer;...;inner count" lines, readable by flamegraph tools
+            "folded": [f"{stack} {count}" for stack, count in self.stacks.most_common()],
+        }
+
+
+class ProfileStore:
+    """
+    Bounded on-disk ring of captured profiles, one JSON file each. The oldest
+    files are removed once `max_files` is exceeded.
+    """
+
+    NAME_PATTERN = re.compile(r"^[\w.-]+\.json$")
+
+    def __init__(self, directory: str, max_files: int = 50):
+        """
+        :param directory: Where profiles are written, created on first use.
+        :param max_files: Profiles kept before the oldest are removed.
+        """
+        self.directory = directory
+        self.max_files = max(1, int(max_files))
+        self._lock = threading.Lock()
+
+    def save(self, profile: dict) -> str:
+        route = re.sub(r"[^\w]+", "_", profile.get("route") or profile["path"]).strip("_") or "root"
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        name = f"{stamp}_{profile['method'].lower()}_{route[:60]}_{int(profile['duration_ms'])}ms.json"
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, name)
+            with open(path, "w", encoding="utf-8") as fh:
+                json.dump(profile, fh)
+            for old in self.list()[self.max_files:]:
+                try:
+                    os.remove(os.path.join(self.directory, old["name"]))
+                except OSError:
+                    pass
+        return name
+
+    def list(self) -> List[dict]:
+        """
+        Stored profiles, newest first.
+        """
+        try:
+            names = [name for name in os.listdir(self.directory) if self.NAME_PATTERN.match(name)]
+        except FileNotFoundError:
+            return []
+        # Names start with a UTC timestamp, so they sort chronologically
+        return [
+            {"name": name, "size": os.path.getsize(os.path.join(self.directory, name))}
+            for name in sorted(names, reverse=True)
+        ]
+
+    def path(self, name: str) -> Optional[str]:
+        """
+        Path of a stored profile, or None for unknown or unsafe names.
+        """
+        if not self.NAME_PATTERN.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+
+class RequestProfiler:
+    """
+    Opt-in sampling profiler for live traffic.
+    When enabled, `sample_rate` of requests are profiled: a background thread
+    records the stacks of every thread each `interval_ms`, and a loop task measures
+    how late it is woken up, i.e. how long the event loop was blocked. Profiles of
+    requests slower than `slow_ms` are written to the store; the rest are discarded.
+    The sampler only runs while a profiled request is in flight.
+    """
+
+    def __init__(
+        self,
+        store: ProfileStore,
+        enabled: bool = False,
+        sample_rate: float = 0.1,
+        slow_ms: float = 2000,
+        interval_ms: float = 5,
+    ):
+        """
+        :param store: Where slow request profiles are written.
+        :param enabled: Start with profiling switched on.
+        :param sample_rate: Fraction of requests profiled, 0 to 1.
+        :param slow_ms: Profiles of requests taking at least this long are kept.
+        :param interval_ms: Time between stack samples and loop lag checks.
+        """
+        self.store = store
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.slow_seconds = 0.0
+        self.interval = 0.005
+        self.configure(enabled=enabled, sample_rate=sample_rate, slow_ms=slow_ms, interval_ms=interval_ms)
+
+        self._active: Dict[int, ProfileCapture] = {}
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+        self._lag_task: Optional[asyncio.Task] = None
+        self._next_lag_check = 0.0
+
+        # Counters
+        self.profiled = 0
+        self.saved = 0
+
+    def configure(
+        self,
+        enabled: Optional[bool] = None,
+        sample_rate: Optional[float] = None,
+        slow_ms: Optional[float] = None,
+        interval_ms: Optional[float] = None,
+    ) -> dict:
+        """
+        Change any of the settings at runtime; returns the resulting settings.
+        """
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if sample_rate is not None:
+            self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+        if slow_ms is not None:
+            self.slow_seconds = max(0.0, float(slow_ms)) / 1000
+        if interval_ms is not None:
+            self.interval = max(1.0, float(interval_ms)) / 1000
+        return self.settings()
+
+    def settings(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_seconds * 1000,
+            "interval_ms": self.interval * 1000,
+        }
+
+    def should_profile(self) -> bool:
+        return self.enabled and random.random() < self.sample_rate
+
+    def start(self, method: str, path: str) -> ProfileCapture:
+        """
+        Begin profiling a request; must be called from the event loop.
+        """
+        capture = ProfileCapture(method, path)
+        with self._lock:
+            self._active[id(capture)] = capture
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+                self._sampler.start()
+        if self._lag_task is None or self._lag_task.done():
+            loop = asyncio.get_running_loop()
+            self._next_lag_check = loop.time() + self.interval
+            self._lag_task = loop.create_task(self._watch_loop_lag())
+        self.profiled += 1
+        return capture
+
+    async def finish(self, capture: ProfileCapture) -> Optional[str]:
+        """
+        Stop profiling a request and store its profile if it was slow.
+        Returns the stored profile name.
+        """
+        duration = time.perf_counter() - capture.started
+        with self._lock:
+            self._active.pop(id(capture), None)
+        # Blocking since the last lag check, e.g. a request that never yielded
+        self._add_lag([capture], asyncio.get_running_loop().time() - self._next_lag_check)
+        if duration < self.slow_seconds:
+            return None
+        try:
+            name = await asyncio.to_thread(self.store.save, capture.to_dict(duration, self.interval))
+        except Exception as exc:
+            logger.warning(f"Could not store profile of {capture.method} {capture.path}: {exc}")
+            return None
+        self.saved += 1
+        logger.info(f"Stored profile {name} ({duration * 1000:.0f} ms {capture.method} {capture.path})")
+        return name
+
+    def _sample(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                captures = list(self._active.values())
+                if not captures:
+                    self._sampler = None
+                    return
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                stacks.append(";".join(reversed(labels)))
+            with self._lock:
+                for capture in captures:
+                    capture.samples += 1
+                    capture.stacks.update(stacks)
+            time.sleep(self.interval)
+
+    async def _watch_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while self._active:
+            await asyncio.sleep(max(0.0, self._next_lag_check - loop.time()))
+            now = loop.time()
+            self._add_lag(list(self._active.values()), now - self._next_lag_check)
+            self._next_lag_check = now + self.interval
+
+    @staticmethod
+    def _add_lag(captures: List[ProfileCapture], lag: float):
+        if lag <= 0:
+            return
+        for capture in captures:
+            capture.loop_blocked_seconds += lag
+            capture.loop_max_lag_seconds = max(capture.loop_max_lag_seconds, lag)
+
+    def stats(self) -> dict:
+        return {
+            **self.settings(),
+            "profiled": self.profiled,
+            "saved": self.saved,
+            "active": len(self._active),
+        }
+
+
+PROFILER = RequestProfiler(
+    ProfileStore(
+        os.getenv("PROFILE_DIR", "storage/profiles"),
+        max_files=int(os.getenv("PROFILE_MAX_FILES", "50")),
+    ),
+    enabled=os.getenv("PROFILE_ENABLED", "false").lower() == "true",
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0.1")),
+    slow_ms=float(os.getenv("PROFILE_SLOW_MS", "2000")),
+    interval_ms=float(os.getenv("PROFILE_INTERVAL_MS", "5")),
+)
@@ -0,0 +1,65 @@
+import os
+import threading
+
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+QDRANT_URL = os.getenv("QDRANT_URL")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+
+# Searches should fail fast; ingestion upserts and deletes can take a while
+QDRANT_SEARCH_TIMEOUT = int(os.getenv("QDRANT_SEARCH_TIMEOUT", "10"))
+QDRANT_INGEST_TIMEOUT = int(os.getenv("QDRANT_INGEST_TIMEOUT", "300"))
+
+_client = None
+_async_client = None
+_lock = threading.Lock()
+
+
+def _client_options(timeout):
+    return {
+        "url": QDRANT_URL,
+        "api_key": QDRANT_API_KEY,
+        "prefer_grpc": QDRANT_PREFER_GRPC,
+        "grpc_port": QDRANT_GRPC_PORT,
+        "timeout": timeout,
+    }
+
+
+def get_qdrant_client() -> QdrantClient:
+    """
+    Process-wide synchronous client, used by ingestion and collection management.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = QdrantClient(**_client_options(QDRANT_INGEST_TIMEOUT))
+    return _client
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """
+    Process-wide async client for the query path. Its connection pool (or gRPC channel)
+    is reused by every request, so searches never block the event loop.
+    """
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = AsyncQdrantClient(**_client_options(QDRANT_SEARCH_TIMEOUT))
+    return _async_client
+
+
+async def close_qdrant_clients():
+    """
+    Close the shared clients, e.g. from the application lifespan.
+    """
+    global _client, _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+    if _client is not None:
+        _client.close()
+        _client = None
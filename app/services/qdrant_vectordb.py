@@ -1,9 +1,64 @@
+import asyncio
 import os
+import threading
+from langchain_core.documents import Document
 from langchain_qdrant import QdrantVectorStore, RetrievalMode
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams
+from qdrant_client.http.models import (
+    Distance, FieldCondition, Filter, FilterSelector, HasIdCondition, MatchValue,
+    PayloadSchemaType, PointStruct, VectorParams
+)
+import hashlib
 import uuid
 
+from app.services.embedding_model import get_embedding_model
+from app.services.qdrant_connection import QDRANT_SEARCH_TIMEOUT, get_async_qdrant_client, get_qdrant_client
+
+# Namespace for deterministic point IDs
+POINT_NAMESPACE = uuid.UUID("6f1c5a52-7d0e-4c39-9a47-5b1f3c2e8d10")
+
+# Manual fields copied into every chunk's metadata at ingestion, usable as search scope
+SCOPE_FIELDS = {
+    "machine_name": PayloadSchemaType.KEYWORD,
+    "model_no": PayloadSchemaType.KEYWORD,
+    "machine_type": PayloadSchemaType.KEYWORD,
+    "vendor_id": PayloadSchemaType.INTEGER,
+}
+
+# Payload fields filtered on by ingestion, deletion and scoped search
+PAYLOAD_INDEXES = {
+    "metadata.document_uuid": PayloadSchemaType.KEYWORD,
+    **{f"metadata.{name}": schema for name, schema in SCOPE_FIELDS.items()},
+}
+
+
+def point_id(document_uuid, text):
+    """
+    Deterministic point ID for a chunk: the same content in the same document always maps
+    to the same point, so re-ingesting overwrites instead of duplicating.
+    """
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{document_uuid}:{content_hash}"))
+
+
+def _document_filter(document_uuid):
+    return Filter(must=[FieldCondition(key="metadata.document_uuid", match=MatchValue(value=document_uuid))])
+
+
+def scope_filter(scope=None):
+    """
+    Build a search filter from scope fields (SCOPE_FIELDS or document_uuid).
+    Empty values are ignored; returns None when nothing is left to filter on.
+    """
+    conditions = []
+    for name, value in (scope or {}).items():
+        if value is None or value == "":
+            continue
+        if name != "document_uuid" and name not in SCOPE_FIELDS:
+            raise ValueError(f"Unknown scope field '{name}'")
+        conditions.append(FieldCondition(key=f"metadata.{name}", match=MatchValue(value=value)))
+    return Filter(must=conditions) if conditions else None
+
+
 class QdrantVectorDB:
     """
     Manages storage and retrieval of vectors in Qdrant. Automatically creates collection if it does not exist.
@@ -15,15 +70,12 @@ class QdrantVectorDB:
         """
         self.embeddings = embeddings
         self.collection_name = collection_name
-        self.client = QdrantClient(
-            url=os.getenv("QDRANT_URL"),
-            api_key=os.getenv("QDRANT_API_KEY"),
-            timeout=300
-        )
+        self.client = get_qdrant_client()
         self._ensure_collection_exists(
             "COSINE",
             True
         )
+        self._ensure_payload_indexes()
         self.vectorstore = QdrantVectorStore(
             client=self.client,
             collection_name=collection_name,
@@ -54,6 +106,19 @@ class QdrantVectorDB:
                     f"Qdrant collection '{self.collection_name}' does not exist and auto_create_collection=False"
                 )
 
+    def _ensure_payload_indexes(self):
+        """
+        Create the payload indexes used by filtered deletes and lookups (no-op when present).
+        """
+        existing = self.client.get_collection(self.collection_name).payload_schema or {}
+        for field_name, schema in PAYLOAD_INDEXES.items():
+            if field_name not in existing:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=schema,
+                )
+
     def _get_embedding_dimension(self):
         """
         Return the embedding model dimension based on known models, with fallback.
@@ -89,10 +154,198 @@ class QdrantVectorDB:
                 doc.metadata = {}
             doc.metadata["document_uuid"] = document_uuid
 
-        return self.vectorstore.add_documents(docs)
+        ids = [point_id(document_uuid, doc.page_content) for doc in docs]
+        return self.vectorstore.add_documents(docs, ids=ids)
+
+    def add_embedded_documents(self, docs, vectors, document_uuid=None):
+        """
+        Upsert document chunks whose embeddings were already computed.
+
+        :param docs: List of document chunks.
+        :param vectors: One embedding per chunk, in the same order.
+        :param document_uuid: UUID for grouping chunks under a single document.
+        :return: List of Qdrant point IDs.
+        """
+        if document_uuid is None:
+            document_uuid = str(uuid.uuid4())
+
+        points = []
+        for doc, vector in zip(docs, vectors):
+            metadata = dict(doc.metadata or {})
+            metadata["document_uuid"] = document_uuid
+            points.append(PointStruct(
+                id=point_id(document_uuid, doc.page_content),
+                vector=vector,
+                payload={
+                    QdrantVectorStore.CONTENT_KEY: doc.page_content,
+                    QdrantVectorStore.METADATA_KEY: metadata,
+                },
+            ))
+
+        self.client.upsert(collection_name=self.collection_name, points=points, wait=True)
+        return [point.id for point in points]
 
     def similarity_search(self, query, k=4):
         """
         Search for similar documents using vector similarity.
         """
         return self.vectorstore.similarity_search_with_score(query, k=k)
+
+    async def asimilarity_search_by_vector(self, embedding, k=4, query_filter=None):
+        """
+        Search with a precomputed query vector on the shared async client.
+        Returns (Document, score) pairs like `similarity_search`.
+        """
+        points = await self._aquery_points(embedding, k, query_filter, with_vectors=False)
+        return [(self._document_from_point(point), point.score) for point in points]
+
+    async def asimilarity_search_with_vectors(self, embedding, k=4, query_filter=None):
+        """
+        Like `asimilarity_search_by_vector`, but returns (Document, score, vector) triples,
+        e.g. for MMR re-ranking.
+        """
+        points = await self._aquery_points(embedding, k, query_filter, with_vectors=True)
+        return [(self._document_from_point(point), point.score, point.vector) for point in points]
+
+    async def _aquery_points(self, embedding, k, query_filter, with_vectors):
+        response = await get_async_qdrant_client().query_points(
+            collection_name=self.collection_name,
+            query=embedding,
+            query_filter=query_filter,
+            limit=k,
+            with_payload=True,
+            with_vectors=with_vectors,
+            timeout=QDRANT_SEARCH_TIMEOUT,
+        )
+        return response.points
+
+    def _document_from_point(self, point):
+        payload = point.payload or {}
+        metadata = dict(payload.get(QdrantVectorStore.METADATA_KEY) or {})
+        metadata["_id"] = point.id
+        metadata["_collection_name"] = self.collection_name
+        return Document(page_content=payload.get(QdrantVectorStore.CONTENT_KEY, ""), metadata=metadata)
+
+    def has_document_content(self, document_uuid, content_sha256):
+        """
+        Whether this document was fully ingested from a file with the given hash,
+        i.e. a run for that file finished and marked it (see mark_document_ingested).
+        """
+        points, _ = self.client.scroll(
+            collection_name=self.collection_name,
+            scroll_filter=Filter(must=[
+                FieldCondition(key="metadata.document_uuid", match=MatchValue(value=document_uuid)),
+                FieldCondition(key="metadata.ingested_sha256", match=MatchValue(value=content_sha256)),
+            ]),
+            limit=1,
+            with_payload=False,
+            with_vectors=False,
+        )
+        return bool(points)
+
+    def existing_point_ids(self, ids):
+        """
+        Return the subset of the given point IDs already stored in the collection.
+        """
+        if not ids:
+            return set()
+        points = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=list(ids),
+            with_payload=False,
+            with_vectors=False,
+        )
+        return {str(point.id) for point in points}
+
+    def set_metadata(self, ids, metadata):
+        """
+        Merge metadata fields into the payload of existing points. Returns the updated IDs.
+        """
+        if ids:
+            self.client.set_payload(
+                collection_name=self.collection_name,
+                payload=metadata,
+                points=list(ids),
+                key=QdrantVectorStore.METADATA_KEY,
+                wait=True,
+            )
+        return list(ids)
+
+    def set_document_metadata(self, document_uuid, metadata):
+        """
+        Merge metadata fields into the payload of every point of a document, with one filtered request.
+        """
+        self.client.set_payload(
+            collection_name=self.collection_name,
+            payload=metadata,
+            points=FilterSelector(filter=_document_filter(document_uuid)),
+            key=QdrantVectorStore.METADATA_KEY,
+            wait=True,
+        )
+
+    def mark_document_ingested(self, document_uuid, content_sha256):
+        """
+        Record on every point of a document that its ingestion from the file with this hash
+        completed. Pass None when a new run starts, so an interrupted run leaves no mark.
+        """
+        self.set_document_metadata(document_uuid, {"ingested_sha256": content_sha256})
+
+    def delete_stale_points(self, document_uuid, keep_ids):
+        """
+        Delete every point of the document whose ID is not in keep_ids, with one filtered request.
+        """
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(filter=Filter(
+                must=_document_filter(document_uuid).must,
+                must_not=[HasIdCondition(has_id=list(keep_ids))] if keep_ids else [],
+            )),
+            wait=True,
+        )
+
+    def delete_document(self, document_uuid):
+        """
+        Delete all points of a document with one filtered request.
+        """
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(filter=_document_filter(document_uuid)),
+            wait=True,
+        )
+
+    def count_document_points(self, document_uuid):
+        return self.client.count(
+            collection_name=self.collection_name,
+            count_filter=_document_filter(document_uuid),
+            exact=True,
+        ).count
+
+
+_vector_dbs = {}
+_vector_dbs_lock = threading.Lock()
+
+
+def get_vector_db(collection_name) -> QdrantVectorDB:
+    """
+    Process-wide QdrantVectorDB of a collection with the shared embedding model,
+    created on first use. Creation checks the collection in Qdrant; when that fails
+    nothing is cached and the next call tries again.
+    """
+    vector_db = _vector_dbs.get(collection_name)
+    if vector_db is None:
+        with _vector_dbs_lock:
+            vector_db = _vector_dbs.get(collection_name)
+            if vector_db is None:
+                vector_db = QdrantVectorDB(collection_name, get_embedding_model())
+                _vector_dbs[collection_name] = vector_db
+    return vector_db
+
+
+async def aget_vector_db(collection_name) -> QdrantVectorDB:
+    """
+    `get_vector_db` for the event loop: the first call's blocking Qdrant requests run in a thread.
+    """
+    vector_db = _vector_dbs.get(collection_name)
+    if vector_db is None:
+        vector_db = await asyncio.to_thread(get_vector_db, collection_name)
+    return vector_db
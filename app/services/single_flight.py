@@ -0,0 +1,126 @@
+import asyncio
+import os
+import re
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+
+def normalize_question(question: str) -> str:
+    """
+    Case, punctuation and whitespace folded, so "Lube oil alarm?" and "lube oil  alarm" match.
+    """
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+
+class _Flight:
+    def __init__(self):
+        self.latest: Any = None
+        self.version = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight upstream calls: the first caller for a key starts
+    the call, callers arriving while it runs wait for the same result instead of
+    starting their own. Nothing is cached once the call has finished.
+
+    The call runs in its own task, so it survives the caller that started it going
+    away; it is only cancelled when every caller waiting on it has gone.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+
+        # Counters
+        self.calls = 0
+        self.shared = 0
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await `call()` once per key among concurrent callers.
+        Returns (result, shared) where shared is True when another caller's call was reused.
+        """
+        async def produce(flight: _Flight):
+            flight.latest = await call()
+            flight.version = 1
+
+        result, shared = None, False
+        async for result, shared in self._subscribe(key, produce):
+            pass
+        return result, shared
+
+    async def stream(self, key: Hashable, call: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Tuple[Any, bool]]:
+        """
+        Iterate `call()` once per key among concurrent callers, yielding (item, shared).
+        Items must be cumulative snapshots (e.g. partial JSON objects): a slow
+        caller skips intermediate ones and only sees the latest.
+        """
+        async def produce(flight: _Flight):
+            async for item in call():
+                async with flight.changed:
+                    flight.latest = item
+                    flight.version += 1
+                    flight.changed.notify_all()
+
+        async for item, shared in self._subscribe(key, produce):
+            yield item, shared
+
+    async def _subscribe(self, key: Hashable, produce: Callable[[_Flight], Awaitable[None]]):
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if shared:
+            self.shared += 1
+        else:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.get_running_loop().create_task(self._produce(key, flight, produce))
+            self.calls += 1
+
+        flight.subscribers += 1
+        seen = 0
+        try:
+            while True:
+                async with flight.changed:
+                    await flight.changed.wait_for(lambda: flight.version > seen or flight.done)
+                    version, latest, done, error = flight.version, flight.latest, flight.done, flight.error
+                if error is not None:
+                    raise error
+                if version > seen:
+                    seen = version
+                    yield latest, shared
+                if done:
+                    return
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                flight.task.cancel()
+
+    async def _produce(self, key: Hashable, flight: _Flight, produce: Callable[[_Flight], Awaitable[None]]):
+        try:
+            await produce(flight)
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+        except Exception as exc:
+            flight.error = exc
+        finally:
+            # Later callers start a new call
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            async with flight.changed:
+                flight.done = True
+                flight.changed.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "upstream_calls": self.calls,
+            "calls_saved": self.shared,
+            "in_flight": len(self._flights),
+        }
+
+
+ANSWER_FLIGHTS = SingleFlight()
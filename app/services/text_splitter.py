@@ -11,7 +11,9 @@ class TextSplitter:
         """
         self.splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap
+            chunk_overlap=chunk_overlap,
+            # Lets retrieval merge neighbouring chunks of the same page
+            add_start_index=True
         )
 
     def split(self, docs):
@@ -19,3 +21,10 @@ class TextSplitter:
         Split documents into chunks.
         """
         return self.splitter.split_documents(docs)
+
+    def iter_split(self, docs):
+        """
+        Split documents one at a time, yielding chunks as they are produced.
+        """
+        for doc in docs:
+            yield from self.splitter.split_documents([doc])
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import update
+
+from app.db.database import SessionLocal
+from app.models.personal_access_tokens import PersonalAccessToken
+from app.utils.logger import logger
+
+
+@dataclass
+class AuthResult:
+    """
+    Outcome of one token lookup: the user, or the HTTP error to raise.
+    """
+    user: Any = None
+    token_id: Optional[int] = None
+    expires_at: Optional[datetime] = None
+    error_status: Optional[int] = None
+    error_detail: Optional[str] = None
+    cached_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def ok(self) -> bool:
+        return self.error_status is None
+
+
+class TokenCache:
+    """
+    Short-lived cache of token hash → authentication result.
+    Valid tokens are kept for `ttl_seconds`; invalid ones for `negative_ttl_seconds`,
+    so repeated bad tokens do not reach the database either. A revoked token stays
+    usable for at most one TTL.
+    """
+
+    def __init__(self, ttl_seconds: float = 60, negative_ttl_seconds: float = 10, max_entries: int = 10000):
+        """
+        :param ttl_seconds: Lifetime of a successful lookup. 0 disables caching.
+        :param negative_ttl_seconds: Lifetime of a failed lookup. 0 disables negative caching.
+        :param max_entries: Least recently used tokens beyond this are evicted.
+        """
+        self.ttl_seconds = float(ttl_seconds)
+        self.negative_ttl_seconds = float(negative_ttl_seconds)
+        self.max_entries = int(max_entries)
+        self._entries: "OrderedDict[str, AuthResult]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token_hash: str) -> Optional[AuthResult]:
+        now = time.monotonic()
+        with self._lock:
+            result = self._entries.get(token_hash)
+            if result is not None:
+                ttl = self.ttl_seconds if result.ok else self.negative_ttl_seconds
+                if now - result.cached_at <= ttl:
+                    self._entries.move_to_end(token_hash)
+                    self.hits += 1
+                    return result
+                del self._entries[token_hash]
+            self.misses += 1
+            return None
+
+    def put(self, token_hash: str, result: AuthResult) -> None:
+        ttl = self.ttl_seconds if result.ok else self.negative_ttl_seconds
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[token_hash] = result
+            self._entries.move_to_end(token_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token_hash: str) -> None:
+        with self._lock:
+            self._entries.pop(token_hash, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class LastUsedWriter:
+    """
+    Write-behind for personal_access_tokens.last_used_at.
+    Requests only record the time in memory; a background thread writes all
+    tokens touched since the last flush in one batched UPDATE.
+    """
+
+    def __init__(self, session_factory: Callable, flush_interval: float = 30):
+        """
+        :param session_factory: Returns a new SQLAlchemy session, e.g. SessionLocal.
+        :param flush_interval: Seconds between flushes.
+        """
+        self.session_factory = session_factory
+        self.flush_interval = float(flush_interval)
+        self._pending: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def touch(self, token_id: int) -> None:
+        with self._lock:
+            self._pending[token_id] = datetime.now(timezone.utc)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="token-last-used", daemon=True)
+                self._thread.start()
+
+    def flush(self) -> int:
+        """
+        Write pending timestamps now. Returns how many tokens were updated.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        db = self.session_factory()
+        try:
+            db.execute(
+                update(PersonalAccessToken),
+                [{"id": token_id, "last_used_at": used_at} for token_id, used_at in pending.items()],
+            )
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            logger.warning(f"Could not update last_used_at of {len(pending)} tokens: {exc}")
+            # Keep the timestamps for the next flush unless newer ones arrived meanwhile
+            with self._lock:
+                for token_id, used_at in pending.items():
+                    self._pending.setdefault(token_id, used_at)
+            return 0
+        finally:
+            db.close()
+        return len(pending)
+
+    def _loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self) -> None:
+        """
+        Stop the background thread and write what is still pending, e.g. on shutdown.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval)
+        self.flush()
+
+
+TOKEN_CACHE = TokenCache(
+    ttl_seconds=float(os.getenv("AUTH_CACHE_TTL", "60")),
+    negative_ttl_seconds=float(os.getenv("AUTH_NEGATIVE_CACHE_TTL", "10")),
+    max_entries=int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000")),
+)
+
+LAST_USED_WRITER = LastUsedWriter(
+    SessionLocal,
+    flush_interval=float(os.getenv("AUTH_LAST_USED_FLUSH_SECONDS", "30")),
+)
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import tempfile
+import time
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.utils.logger import logger
+
+
+class UploadTooLargeError(Exception):
+    """
+    Raised when an upload exceeds the configured maximum size.
+    """
+
+
+async def save_upload(upload: UploadFile, directory: str, max_bytes: int, chunk_size: int = 1024 * 1024):
+    """
+    Stream an upload to a new file under `directory` in fixed-size chunks,
+    hashing it on the way. The partial file is removed on any error.
+
+    :return: (file path, sha256 hex digest, size in bytes)
+    """
+    os.makedirs(directory, exist_ok=True)
+    # Keep the extension, the loader picks the parser from it
+    suffix = os.path.splitext(os.path.basename(upload.filename or ""))[1].lower()
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=directory)
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit")
+                digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+    except BaseException:
+        discard_file(path)
+        raise
+
+    return path, digest.hexdigest(), size
+
+
+def discard_file(path):
+    """
+    Remove a temporary upload, ignoring files that are already gone.
+    """
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as exc:
+        logger.warning(f"Could not remove upload {path}: {exc}")
+
+
+def purge_stale_uploads(directory: str, max_age_seconds: float) -> int:
+    """
+    Delete uploads left behind by a previous process. Returns how many were removed.
+    """
+    if not os.path.isdir(directory):
+        return 0
+
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith("upload_") and os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+            discard_file(path)
+            removed += 1
+    return removed
@@ -1,23 +1,39 @@
+import atexit
 import logging
 import os
-from datetime import datetime
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_DIR = os.getenv("LOG_DIR", "storage/log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
+LOG_MAX_BYTES = int(float(os.getenv("LOG_MAX_MB", "20")) * 1024 * 1024)
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
 
 def setup_logger():
-    log_dir = 'storage/log'
-    os.makedirs(log_dir, exist_ok=True)
+    """
+    Records are put on an in-memory queue by the caller and written to a rotating
+    file by a listener thread, so logging never does file I/O on the event loop.
+    """
+    os.makedirs(LOG_DIR, exist_ok=True)
     
     logger = logging.getLogger('MarineConnect')
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(LOG_LEVEL)
     
-    log_file = os.path.join(log_dir, 'marineconnect.log')
-    file_handler = logging.FileHandler(log_file)
-    file_handler.setLevel(logging.DEBUG)
+    log_file = os.path.join(LOG_DIR, 'marineconnect.log')
+    file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    file_handler.setLevel(LOG_LEVEL)
     
     formatter = logging.Formatter('[%(asctime)s] %(levelname)s: %(message)s')
     file_handler.setFormatter(formatter)
-    
-    logger.addHandler(file_handler)
+
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    # Write out whatever is still queued when the process exits
+    atexit.register(listener.stop)
+
+    logger.addHandler(QueueHandler(log_queue))
     
     return logger
 
-logger = setup_logger()
\ No newline at end of file
+logger = setup_logger()
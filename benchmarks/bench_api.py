@@ -0,0 +1,337 @@
+"""
+End-to-end load benchmark of the API, fully offline.
+
+    python -m benchmarks.bench_api --concurrency 16 --asks 400 --output run.json
+
+Starts, each in its own process:
+- the fake OpenAI-compatible upstream (benchmarks.fake_openai) for chat and embeddings,
+- the API server, pointed at the fake upstream, a fresh SQLite database (needs
+  aiosqlite) or `--database-url`, and Qdrant.
+
+Qdrant is an in-process in-memory store by default. Its searches run on the event
+loop, so pass `--qdrant-url` of a local Qdrant (e.g. `docker run -p 6333:6333 qdrant/qdrant`)
+for numbers comparable to production.
+
+Then it drives /ingest/new, /chat/{session_id}/ask and /chat/{session_id}/history
+at the given concurrency and prints one JSON object with p50/p95/p99 latency,
+requests/sec and ingestion pages/sec per scenario. For ingestion the latencies
+are those of the uploads; pages/sec covers uploading through the last finished job.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+import uuid
+
+import httpx
+
+from benchmarks.bench_pdf_loader import make_synthetic_pdf
+
+TOKEN = "1|benchmark"
+
+QUESTIONS = [
+    "Lube oil pressure alarm on the main engine, what should I check first?",
+    "How do I change over the duplex fuel filter?",
+    "The purifier keeps losing its water seal, what causes that?",
+    "What is the procedure for an emergency stop of the auxiliary engine?",
+    "Why is the exhaust gas temperature high on one cylinder?",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve_upstream(port, latency_ms, tokens_per_sec, embedding_latency_ms):
+    import uvicorn
+
+    from benchmarks.fake_openai import create_app
+
+    app = create_app(latency_ms, tokens_per_sec, embedding_latency_ms)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _serve_api(port, env, qdrant_memory):
+    os.environ.update(env)
+
+    if qdrant_memory:
+        from qdrant_client import AsyncQdrantClient, QdrantClient
+
+        import app.services.qdrant_connection as qdrant_connection
+
+        # Ingestion uses the sync client and questions the async one; share the collections
+        qdrant_connection._client = QdrantClient(":memory:")
+        qdrant_connection._async_client = AsyncQdrantClient(":memory:")
+        qdrant_connection._async_client._client.collections = qdrant_connection._client._client.collections
+        qdrant_connection._async_client._client.aliases = qdrant_connection._client._client.aliases
+
+    from sqlalchemy.orm import Session
+
+    from app.db.database import engine
+    from app.models.chat import ChatSession
+    from app.models.personal_access_tokens import PersonalAccessToken
+    from app.models.user import User
+
+    # Manuals are not created: ingestion then runs without scope fields, as for an unknown uuid
+    for model in (ChatSession, PersonalAccessToken, User):
+        model.metadata.create_all(engine)
+    with Session(engine) as db:
+        if db.get(User, 1) is None:
+            db.add(User(id=1, name="Benchmark", email="benchmark@example.com", password="-"))
+            db.add(PersonalAccessToken(
+                id=1,
+                name="benchmark",
+                token=hashlib.sha256(TOKEN.split("|", 1)[1].encode()).hexdigest(),
+                tokenable_type="App\\Models\\User",
+                tokenable_id=1,
+            ))
+            db.commit()
+
+    import uvicorn
+
+    import server
+
+    uvicorn.run(server.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _start(target, *args) -> multiprocessing.Process:
+    process = multiprocessing.get_context("spawn").Process(target=target, args=args, daemon=True)
+    process.start()
+    return process
+
+
+async def _wait_until_up(client: httpx.AsyncClient, url: str, process: multiprocessing.Process, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while True:
+        if not process.is_alive():
+            raise RuntimeError(f"Server for {url} exited with code {process.exitcode}")
+        try:
+            if (await client.get(url)).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+        await asyncio.sleep(0.25)
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, seconds) -> dict:
+    ordered = sorted(latencies)
+    ms = lambda value: round(value * 1000, 1) if value is not None else None
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "requests_per_sec": round(len(latencies) / seconds, 2) if seconds else None,
+        "p50_ms": ms(_percentile(ordered, 0.50)),
+        "p95_ms": ms(_percentile(ordered, 0.95)),
+        "p99_ms": ms(_percentile(ordered, 0.99)),
+        "max_ms": ms(ordered[-1] if ordered else None),
+    }
+
+
+async def run_load(count, concurrency, send) -> dict:
+    """
+    Call `send(i)` for i in range(count) with at most `concurrency` in flight.
+    A request counts as an error when it raises, returns a non-2xx response
+    or a body with an "error" (the ask route reports LLM failures that way).
+    """
+    latencies, errors = [], 0
+    indexes = iter(range(count))
+
+    async def worker():
+        nonlocal errors
+        for i in indexes:
+            started = time.perf_counter()
+            try:
+                response = await send(i)
+                ok = response.is_success and not response.json().get("error")
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def bench_ingest(client, args, tmp) -> dict:
+    paths = []
+    for number in range(args.ingest_docs):
+        path = os.path.join(tmp, f"manual-{number}.pdf")
+        # Different text per manual, so no upload is skipped as unchanged
+        make_synthetic_pdf(path, args.ingest_pages, lines_per_page=40 + number)
+        paths.append(path)
+
+    jobs = []
+
+    async def upload(i):
+        with open(paths[i], "rb") as fh:
+            response = await client.post(
+                "/ingest/new",
+                data={"uuid": str(uuid.uuid4())},
+                files={"file": (os.path.basename(paths[i]), fh.read(), "application/pdf")},
+            )
+        if response.is_success and "job_id" in response.json():
+            jobs.append(response.json()["job_id"])
+        return response
+
+    started = time.perf_counter()
+    result = await run_load(len(paths), args.ingest_concurrency, upload)
+
+    finished = {}
+    while len(finished) < len(jobs):
+        for job_id in jobs:
+            if job_id not in finished:
+                job = (await client.get(f"/ingest/jobs/{job_id}")).json()
+                if job["status"] in ("succeeded", "failed", "cancelled"):
+                    finished[job_id] = job
+        await asyncio.sleep(0.2)
+    seconds = time.perf_counter() - started
+
+    pages = sum(job["pages_parsed"] for job in finished.values())
+    result.update({
+        "documents": len(paths),
+        "pages_per_document": args.ingest_pages,
+        "jobs_failed": sum(job["status"] != "succeeded" for job in finished.values()),
+        "pages": pages,
+        "chunks": sum(job["points_upserted"] for job in finished.values()),
+        "ingest_seconds": round(seconds, 3),
+        "pages_per_sec": round(pages / seconds, 2) if seconds else None,
+    })
+    return result
+
+
+async def create_sessions(client, count) -> list:
+    sessions = []
+    for number in range(count):
+        response = await client.post("/chat/new", data={"question": f"Benchmark session {number}"})
+        response.raise_for_status()
+        sessions.append(response.json()["session_id"])
+    return sessions
+
+
+async def bench_ask(client, args, sessions) -> dict:
+    async def ask(i):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        if not args.repeat_questions:
+            # Unique questions defeat the answer and query embedding caches
+            question = f"{question} (run {i})"
+        return await client.post(f"/chat/{sessions[i % len(sessions)]}/ask", data={"question": question})
+
+    return await run_load(args.asks, args.concurrency, ask)
+
+
+async def bench_history(client, args, sessions) -> dict:
+    async def history(i):
+        return await client.get(f"/chat/{sessions[i % len(sessions)]}/history")
+
+    return await run_load(args.history, args.concurrency, history)
+
+
+async def run(args, api_url, upstream_url, tmp, processes) -> dict:
+    limits = httpx.Limits(max_connections=max(args.concurrency, args.ingest_concurrency) + 4)
+    async with httpx.AsyncClient(
+        base_url=api_url,
+        headers={"Authorization": f"Bearer {TOKEN}"},
+        timeout=args.timeout,
+        limits=limits,
+    ) as client:
+        await _wait_until_up(client, f"{upstream_url}/stats", processes[0])
+        await _wait_until_up(client, "/health", processes[1])
+
+        results = {}
+        if args.ingest_docs:
+            results["ingest"] = await bench_ingest(client, args, tmp)
+        sessions = await create_sessions(client, args.sessions)
+        if args.asks:
+            results["ask"] = await bench_ask(client, args, sessions)
+        if args.history:
+            results["history"] = await bench_history(client, args, sessions)
+        upstream = (await client.get(f"{upstream_url}/stats")).json()
+    return {"results": results, "upstream_calls": upstream}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent ask and history requests")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--asks", type=int, default=200)
+    parser.add_argument("--history", type=int, default=500)
+    parser.add_argument("--repeat-questions", action="store_true", help="Reuse a few questions, so caches hit")
+    parser.add_argument("--ingest-docs", type=int, default=4)
+    parser.add_argument("--ingest-pages", type=int, default=50)
+    parser.add_argument("--ingest-concurrency", type=int, default=2)
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Fake LLM time to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=60, help="Fake LLM generation speed")
+    parser.add_argument("--embedding-latency-ms", type=float, default=30)
+    parser.add_argument("--qdrant-url", help="Local Qdrant server (default: in-memory)")
+    parser.add_argument("--database-url", help="Sync SQLAlchemy URL, e.g. a local MySQL (default: SQLite)")
+    parser.add_argument("--async-database-url", help="Async SQLAlchemy URL matching --database-url")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", help="Also write the JSON result to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        upstream_port, api_port = _free_port(), _free_port()
+        upstream_url = f"http://127.0.0.1:{upstream_port}"
+        database = os.path.join(tmp, "benchmark.sqlite3")
+        env = {
+            "OPENAI_API_KEY": "benchmark",
+            "LLM_BASE_URL": f"{upstream_url}/v1",
+            "EMBEDDING_BASE_URL": f"{upstream_url}/v1",
+            "DATABASE_URL": args.database_url or f"sqlite:///{database}",
+            "ASYNC_DATABASE_URL": args.async_database_url or f"sqlite+aiosqlite:///{database}",
+            "QDRANT_COLLECTION": f"benchmark_{uuid.uuid4().hex[:8]}",
+            "INGEST_UPLOAD_DIR": os.path.join(tmp, "uploads"),
+            "LOG_DIR": os.path.join(tmp, "log"),
+            # Every run embeds its chunks instead of reading a previous run's store
+            "EMBEDDING_STORE_PATH": "",
+        }
+        if args.qdrant_url:
+            env["QDRANT_URL"] = args.qdrant_url
+
+        processes = [
+            _start(_serve_upstream, upstream_port, args.llm_latency_ms, args.tokens_per_sec, args.embedding_latency_ms),
+            _start(_serve_api, api_port, env, not args.qdrant_url),
+        ]
+        try:
+            report = asyncio.run(run(args, f"http://127.0.0.1:{api_port}", upstream_url, tmp, processes))
+        finally:
+            for process in processes:
+                process.terminate()
+                process.join(10)
+
+    output = {
+        "benchmark": "api",
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("output", "database_url", "async_database_url")
+        },
+        **report,
+    }
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare PDF parsing throughput of the serial loader and the parallel page-range loader.
+
+    python -m benchmarks.bench_pdf_loader manual.pdf --workers 2 4 8
+
+Without a PDF argument a synthetic text PDF is generated. Prints one JSON object.
+The worker pool lives for the whole process, so each parallel setting is timed
+after a warm-up run; the warm-up's time, including process start-up, is
+reported as `cold_seconds`.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import pymupdf
+
+from app.services.document_loader import DocumentLoader
+
+
+def make_synthetic_pdf(path, pages, lines_per_page=60):
+    pdf = pymupdf.open()
+    for number in range(pages):
+        page = pdf.new_page()
+        text = "\n".join(
+            f"Page {number} line {line}: check the lube oil pressure before starting the main engine."
+            for line in range(lines_per_page)
+        )
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=7)
+    pdf.save(path)
+    pdf.close()
+
+
+def run(file_path, workers):
+    loader = DocumentLoader(workers=workers)
+    cold = None
+    if workers > 1:
+        started = time.perf_counter()
+        list(loader.load(file_path))
+        cold = time.perf_counter() - started
+
+    started = time.perf_counter()
+    docs = list(loader.load(file_path))
+    elapsed = time.perf_counter() - started
+    result = {
+        "workers": workers,
+        "pages": len(docs),
+        "seconds": round(elapsed, 4),
+        "pages_per_sec": round(len(docs) / elapsed, 2) if elapsed else None,
+    }
+    if cold is not None:
+        result["cold_seconds"] = round(cold, 4)
+    return docs, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?", help="PDF to parse (default: synthetic)")
+    parser.add_argument("--pages", type=int, default=1000, help="Pages in the synthetic PDF")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, os.cpu_count() or 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = args.pdf
+        if not file_path:
+            file_path = os.path.join(tmp, "synthetic.pdf")
+            make_synthetic_pdf(file_path, args.pages)
+
+        baseline_docs, baseline = run(file_path, workers=0)
+        results = [baseline]
+        for workers in sorted(set(args.workers)):
+            if workers < 2:
+                continue
+            docs, result = run(file_path, workers)
+            result["speedup"] = round(baseline["seconds"] / result["seconds"], 2) if result["seconds"] else None
+            result["identical_output"] = [
+                (d.page_content, d.metadata) for d in docs
+            ] == [(d.page_content, d.metadata) for d in baseline_docs]
+            results.append(result)
+
+    print(json.dumps({"benchmark": "pdf_loader", "file": args.pdf or "synthetic", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+OpenAI-compatible stand-in for DashScope, so benchmarks run offline.
+
+    python -m benchmarks.fake_openai --port 9100 --latency-ms 300 --tokens-per-sec 60
+
+Serves /v1/chat/completions (plain and streamed) and /v1/embeddings. Chat
+answers are a valid QA JSON object delivered after `latency_ms` (time to first
+token) at `tokens_per_sec`; embeddings are deterministic unit vectors derived
+from the input text, returned after `embedding_latency_ms` per call.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER = {
+    "summary": "Check the lube oil pressure and the filter differential pressure before restarting the engine.",
+    "advice_points": [
+        "Stop the engine if the lube oil pressure stays below the alarm limit.",
+        "Inspect the duplex filter and change over to the clean side.",
+        "Record the readings in the engine log before and after the change.",
+    ],
+    "followup_questions": [
+        "What is the normal lube oil pressure range?",
+        "How do I change over the duplex filter?",
+        "When should the lube oil be analysed?",
+    ],
+}
+
+
+def embedding_for(value, dim: int) -> list:
+    if not isinstance(value, str):
+        value = json.dumps(value)
+    seed = int.from_bytes(hashlib.sha256(value.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def _tokens(text: str, size: int = 4) -> list:
+    # Roughly four characters per token, like English text through a BPE tokenizer
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def create_app(
+    latency_ms: float = 300,
+    tokens_per_sec: float = 60,
+    embedding_latency_ms: float = 30,
+    dim: int = 1024,
+) -> FastAPI:
+    """
+    :param latency_ms: Delay before the first chat token.
+    :param tokens_per_sec: Chat generation speed after the first token.
+    :param embedding_latency_ms: Delay of every embeddings call, whatever its batch size.
+    :param dim: Embedding dimension; the app's collection uses 1024.
+    """
+    app = FastAPI(title="Fake OpenAI")
+    stats = {"chat_completions": 0, "embedding_calls": 0, "embedding_inputs": 0}
+    token_delay = 1 / tokens_per_sec if tokens_per_sec > 0 else 0
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        stats["embedding_calls"] += 1
+        stats["embedding_inputs"] += len(inputs)
+        await asyncio.sleep(embedding_latency_ms / 1000)
+        return {
+            "object": "list",
+            "model": body.get("model", ""),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": embedding_for(value, dim)}
+                for i, value in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["chat_completions"] += 1
+        model = body.get("model", "fake")
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        tokens = _tokens(json.dumps(ANSWER))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency_ms / 1000 + len(tokens) * token_delay)
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def chunk(delta, finish_reason=None, usage_data=None):
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+            }
+            if usage_data is not None:
+                data["usage"] = usage_data
+            return f"data: {json.dumps(data)}\n\n"
+
+        async def stream():
+            await asyncio.sleep(latency_ms / 1000)
+            yield chunk({"role": "assistant", "content": ""})
+            for token in tokens:
+                yield chunk({"content": token})
+                if token_delay:
+                    await asyncio.sleep(token_delay)
+            yield chunk({}, finish_reason="stop")
+            if include_usage:
+                yield chunk(None, usage_data=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-sec", type=float, default=60)
+    parser.add_argument("--embedding-latency-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    app = create_app(args.latency_ms, args.tokens_per_sec, args.embedding_latency_ms)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
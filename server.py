@@ -1,35 +1,70 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.routes.protected import router as protected_router
+from app.routes.admin import router as admin_router
 from app.routes.qa import router as qa_router
-from app.routes.ingest import router as ingest
+from app.routes.ingest import router as ingest, INGEST_JOBS, MAX_UPLOAD_BODY_BYTES, UPLOAD_DIR
+from app.services.uploads import purge_stale_uploads
+from app.services.qdrant_connection import close_qdrant_clients
+from app.services.token_cache import LAST_USED_WRITER
+from app.db.database import close_engines
+from app.db.schema import ensure_schema
+from app.langchain.qa_chain import CHAIN_REGISTRY, DEFAULT_MODEL, DEFAULT_TEMPERATURE, OWNER
+from app.langchain.conversation import CONVERSATION_SUMMARIZER
+from app.langchain.context_builder import load_tokenizer
+from app.services.chat_writer import CHAT_WRITER
+from app.services.single_flight import ANSWER_FLIGHTS
+from app.services.answer_cache import ANSWER_CACHE
+from app.services.token_cache import TOKEN_CACHE
+from app.services.embedding_model import get_embedding_model
+from app.services.health import READINESS
+from app.services.qdrant_vectordb import aget_vector_db
+from app.config import LLM_WARMUP
+from app.Http.Middleware.body_limit import BodySizeLimitMiddleware
+from app.Http.Middleware.metrics import MetricsMiddleware
+from app.Http.Middleware.profiling import ProfilingMiddleware
+from app.Http.Middleware.request_logging import RequestLoggingMiddleware
 from app.utils.logger import logger
-import json
-
-# Request logging middleware
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Log request details
-        logger.info(f"""
-Request: {request.method} {request.url}
-Headers: {json.dumps(dict(request.headers))}
-Client: {request.client.host}
-        """.strip())
-        
-        response = await call_next(request)
-        return response
+from app.utils.metrics import REGISTRY
 
 # Lifespan context manager replaces on_event handlers
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Application starting up…")
-    # e.g., initialize DB connections, load models
+    # Uploads of jobs that never finished in a previous run
+    purge_stale_uploads(UPLOAD_DIR, max_age_seconds=24 * 3600)
+    # Columns and indexes added to the chat models since the tables were created
+    try:
+        await ensure_schema()
+    except Exception as exc:
+        logger.warning(f"Could not upgrade the chat schema at startup: {exc}")
+    # One embedding model and vector store per process, created here rather than at import.
+    # An unreachable Qdrant must not stop the worker; it is retried on first use.
+    get_embedding_model()
+    # Token counting runs on the event loop for every answer; its BPE file may need a download
+    await asyncio.to_thread(load_tokenizer)
+    try:
+        await aget_vector_db(OWNER)
+    except Exception as exc:
+        logger.warning(f"Qdrant collection '{OWNER}' not available at startup: {exc}")
+    # Prebuild the default QA chain and open the shared LLM connection pool
+    CHAIN_REGISTRY.get(DEFAULT_MODEL, DEFAULT_TEMPERATURE, True)
+    if LLM_WARMUP:
+        await CHAIN_REGISTRY.warm_up()
     yield
     logger.info("Application shutting down…")
-    # cleanup here
+    INGEST_JOBS.shutdown()
+    LAST_USED_WRITER.stop()
+    # Queued chat messages first; their flush may schedule summaries
+    await CHAT_WRITER.aclose()
+    await CONVERSATION_SUMMARIZER.drain()
+    await CHAIN_REGISTRY.aclose()
+    await close_qdrant_clients()
+    await close_engines()
+    get_embedding_model().close_document_store()
 
 app = FastAPI(
     title="Maritime Connect API",
@@ -47,9 +82,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Refuse oversized uploads while they are received, not after Starlette has spooled them
+app.add_middleware(BodySizeLimitMiddleware, limits={"/ingest/new": MAX_UPLOAD_BODY_BYTES})
+
+# Opt-in sampling profiler for slow requests, see /admin/profiling
+app.add_middleware(ProfilingMiddleware)
+
+# Per-route latency histograms and the Server-Timing header
+app.add_middleware(MetricsMiddleware)
+
 # Add request logging middleware (comment out to disable)
 app.add_middleware(RequestLoggingMiddleware)
 
+# Cache and queue counters are read from their stats() at scrape time.
+# Caches are looked up by getter, the embedding model is only created on first use.
+# A getter returning None (a disabled cache) is skipped.
+CACHES = {
+    "answer": lambda: ANSWER_CACHE,
+    "query_embedding": lambda: get_embedding_model().query_cache,
+    "document_embedding": lambda: get_embedding_model().document_store,
+    "auth_token": lambda: TOKEN_CACHE,
+}
+
+
+def _cache_lookups():
+    samples = []
+    for name, getter in CACHES.items():
+        cache = getter()
+        if cache is None:
+            continue
+        stats = cache.stats()
+        samples.extend(((name, result), stats[key]) for result, key in (("hit", "hits"), ("miss", "misses")))
+    return samples
+
+
+REGISTRY.callback(
+    "rag_cache_lookups_total", "Cache lookups by result.", "counter", ("cache", "result"), _cache_lookups,
+)
+
+
+def _embedding_store_rows():
+    store = get_embedding_model().document_store
+    return [((), store.stats()["rows"])] if store is not None else []
+
+
+REGISTRY.callback(
+    "rag_embedding_store_rows", "Chunk embeddings in the persistent store, bounded by EMBEDDING_STORE_MAX_ROWS.",
+    "gauge", (), _embedding_store_rows,
+)
+REGISTRY.callback(
+    "rag_chat_messages_total", "Chat messages handled by the write-behind queue.", "counter", ("result",),
+    lambda: [((result,), CHAT_WRITER.stats()[result]) for result in ("written", "dropped")],
+)
+REGISTRY.callback(
+    "rag_answer_generations_total", "Answers by whether they called the LLM or joined an identical call in flight.",
+    "counter", ("result",),
+    lambda: [
+        (("upstream",), ANSWER_FLIGHTS.stats()["upstream_calls"]),
+        (("coalesced",), ANSWER_FLIGHTS.stats()["calls_saved"]),
+    ],
+)
+REGISTRY.callback(
+    "rag_chat_messages_pending", "Chat messages waiting to be written.", "gauge", (),
+    lambda: [((), CHAT_WRITER.stats()["pending"])],
+)
+
 # Exception handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
@@ -60,15 +157,31 @@ async def general_exception_handler(request: Request, exc: Exception):
     logger.error(f"Unexpected error: {exc}")
     return JSONResponse(status_code=500, content={"detail": "Internal server error"})
 
-# Health check endpoint
+# Liveness: the process is up and serving; no dependency is touched
 @app.get("/health")
+@app.get("/health/live")
 async def health_check():
     return {"status": "healthy"}
 
+# Readiness: MySQL, Qdrant and the LLM endpoint, each checked at most once per HEALTH_CHECK_TTL
+@app.get("/health/ready")
+async def readiness_check():
+    report = await READINESS.check()
+    return JSONResponse(
+        status_code=200 if report["ready"] else 503,
+        content={"status": "ready" if report["ready"] else "unavailable", **report},
+    )
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # Mount routers
 app.include_router(protected_router)
 app.include_router(qa_router)
 app.include_router(ingest)
+app.include_router(admin_router)
 
 if __name__ == "__main__":
     import uvicorn